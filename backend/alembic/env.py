@@ -11,6 +11,9 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from app.core.database import Base
 from app.models.user import User
 from app.models.expense import Expense
+from app.models.monthly_rollup import MonthlyRollup
+from app.models.data_version import UserDataVersion
+from app.models.report_job import ReportJob
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
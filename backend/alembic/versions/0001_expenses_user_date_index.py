@@ -0,0 +1,53 @@
+"""add composite (user_id, transaction_date, created_at) index on expenses
+
+Revision ID: 0001_expenses_user_date_index
+Revises:
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_expenses_user_date_index'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "ix_expenses_user_date_created"
+
+
+def upgrade() -> None:
+    columns = [
+        sa.text("user_id"),
+        sa.text("transaction_date DESC"),
+        sa.text("created_at DESC"),
+    ]
+    if op.get_bind().dialect.name == "postgresql":
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            op.create_index(
+                INDEX_NAME,
+                "expenses",
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+    else:
+        op.create_index(INDEX_NAME, "expenses", columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(
+                INDEX_NAME,
+                table_name="expenses",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+    else:
+        op.drop_index(INDEX_NAME, table_name="expenses", if_exists=True)
@@ -0,0 +1,62 @@
+"""add monthly_rollups table and backfill it from expenses
+
+Revision ID: 0002_monthly_rollups
+Revises: 0001_expenses_user_date_index
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_monthly_rollups'
+down_revision: Union[str, None] = '0001_expenses_user_date_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    rollups = op.create_table(
+        "monthly_rollups",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Integer(), nullable=False),
+        sa.Column("transaction_type", sa.String(length=10), nullable=False),
+        sa.Column("total_amount", sa.Float(), nullable=False),
+        sa.Column("txn_count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("user_id", "year", "month", "transaction_type"),
+    )
+
+    expenses = sa.table(
+        "expenses",
+        sa.column("id", sa.Integer),
+        sa.column("user_id", sa.Integer),
+        sa.column("amount", sa.Float),
+        sa.column("transaction_type", sa.String),
+        sa.column("transaction_date", sa.DateTime(timezone=True)),
+    )
+    year_col = sa.cast(sa.extract("year", expenses.c.transaction_date), sa.Integer)
+    month_col = sa.cast(sa.extract("month", expenses.c.transaction_date), sa.Integer)
+    source = sa.select(
+        expenses.c.user_id,
+        year_col,
+        month_col,
+        expenses.c.transaction_type,
+        sa.func.sum(expenses.c.amount),
+        sa.func.count(expenses.c.id),
+    ).group_by(expenses.c.user_id, year_col, month_col, expenses.c.transaction_type)
+
+    op.execute(
+        rollups.insert().from_select(
+            ["user_id", "year", "month", "transaction_type", "total_amount", "txn_count"],
+            source,
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("monthly_rollups")
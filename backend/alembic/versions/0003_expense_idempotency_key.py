@@ -0,0 +1,45 @@
+"""add idempotency_key to expenses
+
+Revision ID: 0003_expense_idempotency_key
+Revises: 0002_monthly_rollups
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_expense_idempotency_key'
+down_revision: Union[str, None] = '0002_monthly_rollups'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "uq_expenses_user_idempotency_key"
+
+
+def upgrade() -> None:
+    op.add_column("expenses", sa.Column("idempotency_key", sa.String(length=128), nullable=True))
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(
+                INDEX_NAME,
+                "expenses",
+                ["user_id", "idempotency_key"],
+                unique=True,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+    else:
+        op.create_index(INDEX_NAME, "expenses", ["user_id", "idempotency_key"], unique=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(INDEX_NAME, table_name="expenses", postgresql_concurrently=True, if_exists=True)
+    else:
+        op.drop_index(INDEX_NAME, table_name="expenses", if_exists=True)
+    op.drop_column("expenses", "idempotency_key")
@@ -0,0 +1,47 @@
+"""add report_jobs table
+
+Revision ID: 0005_report_jobs
+Revises: 0004_user_data_versions
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_report_jobs'
+down_revision: Union[str, None] = '0004_user_data_versions'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "report_jobs",
+        sa.Column("id", sa.String(length=32), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("format", sa.String(length=8), nullable=False),
+        sa.Column("start_date", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("end_date", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("transaction_type", sa.String(length=10), nullable=True),
+        sa.Column("cache_key", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("progress", sa.Integer(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("file_path", sa.String(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_report_jobs_user_cache_key", "report_jobs", ["user_id", "cache_key"])
+    op.create_index("ix_report_jobs_status_created", "report_jobs", ["status", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_report_jobs_status_created", table_name="report_jobs")
+    op.drop_index("ix_report_jobs_user_cache_key", table_name="report_jobs")
+    op.drop_table("report_jobs")
@@ -0,0 +1,61 @@
+"""one pending report job per report
+
+Revision ID: 0006_report_jobs_pending_unique
+Revises: 0005_report_jobs
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_report_jobs_pending_unique'
+down_revision: Union[str, None] = '0005_report_jobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "uq_report_jobs_pending_cache_key"
+PENDING = sa.text("status IN ('queued', 'running')")
+
+
+def upgrade() -> None:
+    # Duplicates queued by earlier races would block the index: keep the newest
+    op.execute(
+        """
+        UPDATE report_jobs SET status = 'failed', error = 'Duplicate of another queued job'
+        WHERE status IN ('queued', 'running') AND EXISTS (
+            SELECT 1 FROM report_jobs AS other
+            WHERE other.user_id = report_jobs.user_id
+              AND other.cache_key = report_jobs.cache_key
+              AND other.status IN ('queued', 'running')
+              AND (other.created_at > report_jobs.created_at
+                   OR (other.created_at = report_jobs.created_at AND other.id > report_jobs.id))
+        )
+        """
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(
+                INDEX_NAME,
+                "report_jobs",
+                ["user_id", "cache_key"],
+                unique=True,
+                postgresql_where=PENDING,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+    else:
+        op.create_index(
+            INDEX_NAME, "report_jobs", ["user_id", "cache_key"], unique=True, sqlite_where=PENDING, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(INDEX_NAME, table_name="report_jobs", postgresql_concurrently=True, if_exists=True)
+    else:
+        op.drop_index(INDEX_NAME, table_name="report_jobs", if_exists=True)
@@ -1,11 +1,21 @@
+import json
+import logging
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.api.routes.auth import get_current_user
 from app.models.user import User
-from app.services.ai_service import get_ai_response, generate_chart
+from app.services.ai_service import (
+    PreparedChat, get_ai_response, generate_chart, prepare_chat, check_ai_response, cacheable_answer
+)
+from app.services.answer_cache import cache_answer_async
+from app.services.llm_providers import get_llm_provider
 from pydantic import BaseModel
-from typing import Optional
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -15,6 +25,16 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     chart_url: Optional[str] = None
+    source: str = "llm"  # sql, cache or llm: how the answer was produced
+
+CHART_KEYWORDS = ['chart', 'graph', 'plot', 'visualize']
+
+def _wants_chart(message: str) -> bool:
+    return any(keyword in message.lower() for keyword in CHART_KEYWORDS)
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_ai(
@@ -23,14 +43,64 @@ async def chat_with_ai(
     db: Session = Depends(get_db)
 ):
     try:
-        response = await get_ai_response(request.message, current_user.id, db)
+        answer = await get_ai_response(request.message, current_user.id, db)
         chart_url = None
-        print(f"recieved resp from llm : ", response)
         # Check if chart generation is requested
-        if any(keyword in request.message.lower() for keyword in ['chart', 'graph', 'plot', 'visualize']):
+        if _wants_chart(request.message):
             chart_url = await generate_chart(request.message, current_user.id, db)
         
-        return ChatResponse(response=str(response), chart_url=chart_url)
+        return ChatResponse(response=answer.response, chart_url=chart_url, source=answer.source)
     except Exception as e:
 
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _stream_chat(chat: PreparedChat, message: str, user_id: int, db: Session) -> AsyncIterator[str]:
+    # Comment line: flushes the headers so the client sees the stream open at once
+    yield ": connected\n\n"
+    if chat.answer is not None:
+        yield _sse({"token": chat.answer})
+        yield await _done_event(chat.answer, chat.source, message, user_id, db)
+        return
+
+    tokens = get_llm_provider().stream_response(chat.prompt)
+    parts = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield _sse({"token": token})
+    except Exception as e:
+        logger.warning(f"AI stream error: {e}")
+        yield _sse({"detail": "Sorry, I'm having connection issues. Please try again."}, event="error")
+        return
+    finally:
+        # Also runs when the client disconnects and Starlette cancels this
+        # generator: closing the provider stream drops the upstream request
+        await tokens.aclose()
+
+    # Tokens already shown are replaced by the checked answer if it fails the safety check
+    response = "".join(parts).strip()
+    answer = check_ai_response(response)
+    if cacheable_answer(response):
+        await cache_answer_async(chat.cache_key, answer)
+    yield await _done_event(answer, chat.source, message, user_id, db)
+
+async def _done_event(answer: str, source: str, message: str, user_id: int, db: Session) -> str:
+    done = {"response": answer, "source": source}
+    if _wants_chart(message):
+        done["chart_url"] = await generate_chart(message, user_id, db)
+    return _sse(done, event="done")
+
+@router.post("/chat/stream")
+async def chat_with_ai_stream(
+    request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Chat answer relayed as Server-Sent Events: "data" events carry tokens as
+    the model produces them, then a "done" event carries the final response"""
+    chat = await run_in_threadpool(prepare_chat, request.message, current_user.id, db)
+    return StreamingResponse(
+        _stream_chat(chat, request.message, current_user.id, db),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,10 +1,17 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token, verify_token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.security import (
+    PasswordHashingBusy, create_access_token, get_password_hash_async,
+    verify_and_update_password_async, verify_token
+)
 from app.models.user import User
+from app.services.user_cache import (
+    cache_token_subject, cache_user_async, get_cached_token_subject, get_cached_user_async
+)
 from pydantic import BaseModel, EmailStr
 
 router = APIRouter()
@@ -22,41 +29,75 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-in requests, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/signup", response_model=Token)
-async def signup(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await get_password_hash_async(user.password)
+    except PasswordHashingBusy:
+        raise _busy()
     db_user = User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     access_token = create_access_token(data={"sub": str(db_user.id)})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    try:
+        verified, new_hash = await verify_and_update_password_async(user.password, db_user.hashed_password)
+    except PasswordHashingBusy:
+        raise _busy()
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    if new_hash:
+        # Argon2 parameters changed since this hash was made
+        db_user.hashed_password = new_hash
+        await db.commit()
+    
     access_token = create_access_token(data={"sub": str(db_user.id)})
     return {"access_token": access_token, "token_type": "bearer"}
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = verify_token(token)
-    if payload is None:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user_id = payload.get("sub")
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    user_id = get_cached_token_subject(token)
     if user_id is None:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        payload = verify_token(token)
+        if payload is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        
+        subject = payload.get("sub")
+        if subject is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        user_id = int(subject)
+        cache_token_subject(token, user_id, payload)
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = await get_cached_user_async(user_id)
     if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
+        user = await db.get(User, user_id)
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        await cache_user_async(user)
+    
+    if user.is_active is False:
+        raise HTTPException(status_code=401, detail="User is inactive")
     
     return user
\ No newline at end of file
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.api.routes.auth import get_current_user
 from app.models.user import User
 from app.models.expense import Expense, TransactionType
-from pydantic import BaseModel
-from datetime import datetime
+from app.services.rollup_service import collect_rollup_deltas, apply_rollup_deltas
+from app.services.expense_listing import expense_filters
+from pydantic import BaseModel, Field, model_validator
+from datetime import date, datetime
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -15,28 +19,122 @@ class ExpenseUpdate(BaseModel):
     transaction_type: TransactionType
     transaction_date: datetime
 
+class ExpenseSelection(BaseModel):
+    """Expenses to act on: explicit ids and/or a filter, combined with AND"""
+    ids: Optional[List[int]] = Field(None, max_length=5000)
+    from_date: Optional[date] = None
+    to_date: Optional[date] = None
+    transaction_type: Optional[TransactionType] = None
+    details_contains: Optional[str] = None
+
+    @model_validator(mode="after")
+    def require_selection(self):
+        if not self.ids and not any([self.from_date, self.to_date, self.transaction_type, self.details_contains]):
+            raise ValueError("Provide ids or at least one filter")
+        return self
+
+class ExpenseChanges(BaseModel):
+    details: Optional[str] = None
+    amount: Optional[float] = None
+    transaction_type: Optional[TransactionType] = None
+    transaction_date: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def require_change(self):
+        if not self.model_dump(exclude_none=True):
+            raise ValueError("Provide at least one field to change")
+        return self
+
+class BatchUpdateRequest(BaseModel):
+    selection: ExpenseSelection
+    changes: ExpenseChanges
+
+def _selection_criteria(user_id: int, selection: ExpenseSelection) -> list:
+    criteria = expense_filters(user_id, selection.from_date, selection.to_date, selection.transaction_type)
+    if selection.ids:
+        criteria.append(Expense.id.in_(selection.ids))
+    if selection.details_contains:
+        criteria.append(Expense.details.icontains(selection.details_contains, autoescape=True))
+    return criteria
+
+async def _lock_selected_ids(db: AsyncSession, user_id: int, selection: ExpenseSelection) -> List[int]:
+    result = await db.execute(
+        select(Expense.id).where(*_selection_criteria(user_id, selection)).with_for_update()
+    )
+    return list(result.scalars().all())
+
+@router.post("/batch-update")
+async def batch_update_expenses(
+    request: BatchUpdateRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user_id = current_user.id
+    ids = await _lock_selected_ids(db, user_id, request.selection)
+    if not ids:
+        return {"message": "No matching expenses", "matched": 0, "updated": 0}
+    
+    in_batch = (Expense.user_id == user_id, Expense.id.in_(ids))
+    previous = await db.run_sync(collect_rollup_deltas, *in_batch)
+    result = await db.execute(
+        update(Expense).where(*in_batch).values(**request.changes.model_dump(exclude_none=True)),
+        execution_options={"synchronize_session": False}
+    )
+    current = await db.run_sync(collect_rollup_deltas, *in_batch)
+    await db.run_sync(apply_rollup_deltas, added=current, removed=previous)
+    await db.commit()
+    
+    return {"message": "Expenses updated successfully", "matched": len(ids), "updated": result.rowcount}
+
+@router.post("/batch-delete")
+async def batch_delete_expenses(
+    selection: ExpenseSelection,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user_id = current_user.id
+    ids = await _lock_selected_ids(db, user_id, selection)
+    if not ids:
+        return {"message": "No matching expenses", "matched": 0, "deleted": 0}
+    
+    in_batch = (Expense.user_id == user_id, Expense.id.in_(ids))
+    deltas = await db.run_sync(collect_rollup_deltas, *in_batch)
+    result = await db.execute(
+        delete(Expense).where(*in_batch),
+        execution_options={"synchronize_session": False}
+    )
+    await db.run_sync(apply_rollup_deltas, removed=deltas)
+    await db.commit()
+    
+    return {"message": "Expenses deleted successfully", "matched": len(ids), "deleted": result.rowcount}
+
 @router.put("/{expense_id}")
 async def update_expense(
     expense_id: int,
     expense_update: ExpenseUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    expense = db.query(Expense).filter(
+    result = await db.execute(select(Expense).where(
         Expense.id == expense_id,
         Expense.user_id == current_user.id
-    ).first()
+    ))
+    expense = result.scalars().first()
     
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
+    previous = await db.run_sync(collect_rollup_deltas, Expense.id == expense.id)
     expense.details = expense_update.details
     expense.amount = expense_update.amount
     expense.transaction_type = expense_update.transaction_type
     expense.transaction_date = expense_update.transaction_date
+    await db.flush()
+    current = await db.run_sync(collect_rollup_deltas, Expense.id == expense.id)
+    await db.run_sync(apply_rollup_deltas, added=current, removed=previous)
     
-    db.commit()
-    db.refresh(expense)
+    await db.commit()
+    await db.refresh(expense)
     
     return {"message": "Expense updated successfully", "expense": expense}
 
@@ -44,17 +142,20 @@ async def update_expense(
 async def delete_expense(
     expense_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    expense = db.query(Expense).filter(
+    result = await db.execute(select(Expense).where(
         Expense.id == expense_id,
         Expense.user_id == current_user.id
-    ).first()
+    ))
+    expense = result.scalars().first()
     
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    db.delete(expense)
-    db.commit()
+    deltas = await db.run_sync(collect_rollup_deltas, Expense.id == expense.id)
+    await db.run_sync(apply_rollup_deltas, removed=deltas)
+    await db.delete(expense)
+    await db.commit()
     
     return {"message": "Expense deleted successfully"}
\ No newline at end of file
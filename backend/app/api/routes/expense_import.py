@@ -0,0 +1,109 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, ValidationError
+from typing import Iterator, List, Optional
+import itertools
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.api.routes.auth import get_current_user
+from app.api.routes.expenses import ExpenseCreate
+from app.models.user import User
+from app.models.expense import Expense
+from app.services.import_service import ImportFormatError, ParsedRow, detect_format, iter_upload_rows
+from app.services.rollup_service import collect_rollup_deltas, apply_rollup_deltas
+
+router = APIRouter()
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    dry_run: bool
+    total_rows: int
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+    errors_truncated: bool = False
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc']) or 'row'}: {e['msg']}" for e in error.errors()
+    )
+
+def _parse_batch(rows: Iterator[ParsedRow], user_id: int, batch_size: int):
+    """Parse and validate the next `batch_size` records (runs in a worker thread)"""
+    values, errors, seen = [], [], 0
+    for row_number, record, error in itertools.islice(rows, batch_size):
+        seen += 1
+        if error is None:
+            try:
+                expense = ExpenseCreate(**record)
+            except ValidationError as e:
+                error = _format_validation_error(e)
+        if error is not None:
+            errors.append(ImportRowError(row=row_number, error=error))
+            continue
+        values.append({
+            "user_id": user_id,
+            "details": expense.details,
+            "amount": expense.amount,
+            "transaction_type": expense.transaction_type,
+            "transaction_date": expense.transaction_date,
+        })
+    return values, errors, seen
+
+@router.post("/import", response_model=ImportReport)
+async def import_expenses(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv or jsonl; detected from the file name when omitted"),
+    dry_run: bool = Query(False),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Import a bank statement (CSV or JSON lines), validating every row and inserting in batches"""
+    try:
+        fmt = detect_format(file.filename, file.content_type, format)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = iter_upload_rows(file.file, fmt)
+    total_rows = imported = failed = 0
+    errors: List[ImportRowError] = []
+
+    try:
+        while True:
+            values, batch_errors, seen = await run_in_threadpool(
+                _parse_batch, rows, current_user.id, settings.IMPORT_BATCH_SIZE
+            )
+            if not seen:
+                break
+            total_rows += seen
+            failed += len(batch_errors)
+            errors.extend(batch_errors[:max(settings.IMPORT_MAX_ERRORS - len(errors), 0)])
+
+            if values and not dry_run:
+                result = await db.execute(insert(Expense).returning(Expense.id), values)
+                ids = result.scalars().all()
+                deltas = await db.run_sync(collect_rollup_deltas, Expense.id.in_(ids))
+                await db.run_sync(apply_rollup_deltas, added=deltas)
+            imported += len(values)
+
+        if not dry_run:
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        rows.close()
+
+    return ImportReport(
+        dry_run=dry_run,
+        total_rows=total_rows,
+        imported=imported,
+        failed=failed,
+        errors=errors,
+        errors_truncated=failed > len(errors)
+    )
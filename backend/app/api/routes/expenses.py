@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Header
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.config import settings
 from app.api.routes.auth import get_current_user
 from app.models.user import User
 from app.models.expense import Expense, TransactionType
+from app.services.stats_service import get_month_range, get_period_totals, last_n_months
+from app.services.rollup_service import collect_rollup_deltas, apply_rollup_deltas
+from app.services.expense_listing import expense_filters, fetch_expense_page, InvalidCursor
+from app.services.group_commit import expense_committer, find_idempotent_expenses
 from pydantic import BaseModel
 from datetime import datetime, date
 from typing import List, Optional
@@ -25,6 +31,10 @@ class ExpenseResponse(BaseModel):
     transaction_date: datetime
     created_at: datetime
 
+class ExpensePage(BaseModel):
+    items: List[ExpenseResponse]
+    next_cursor: Optional[str] = None
+
 class MonthlyStats(BaseModel):
     total_credit: float
     total_debit: float
@@ -33,98 +43,116 @@ class MonthlyStats(BaseModel):
 @router.post("/", response_model=ExpenseResponse)
 async def create_expense(
     expense: ExpenseCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_expense = Expense(
-        user_id=current_user.id,
-        details=expense.details,
-        amount=expense.amount,
-        transaction_type=expense.transaction_type.value.lower(),
-        transaction_date=expense.transaction_date
-    )
+    user_id = current_user.id
+    values = {
+        "user_id": user_id,
+        "details": expense.details,
+        "amount": expense.amount,
+        "transaction_type": expense.transaction_type,
+        "transaction_date": expense.transaction_date,
+        "idempotency_key": idempotency_key,
+    }
+    if settings.EXPENSE_GROUP_COMMIT:
+        return await expense_committer.submit(values)
+    
+    if idempotency_key:
+        existing = await find_idempotent_expenses(db, [(user_id, idempotency_key)])
+        if existing:
+            return existing[(user_id, idempotency_key)]
+    
+    db_expense = Expense(**values)
     db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        if not idempotency_key:
+            raise
+        # A concurrent retry with the same Idempotency-Key won the race
+        existing = await find_idempotent_expenses(db, [(user_id, idempotency_key)])
+        if not existing:
+            raise
+        return existing[(user_id, idempotency_key)]
+    deltas = await db.run_sync(collect_rollup_deltas, Expense.id == db_expense.id)
+    await db.run_sync(apply_rollup_deltas, added=deltas)
+    await db.commit()
+    await db.refresh(db_expense)
     return db_expense
 
 @router.get("/", response_model=List[ExpenseResponse])
 async def get_expenses(
-    year: int = Query(...),
-    month: int = Query(...),
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    expenses = db.query(Expense).filter(
+    start_date, end_date = get_month_range(year, month)
+    result = await db.execute(select(Expense).where(
         Expense.user_id == current_user.id,
-        extract('year', Expense.transaction_date) == year,
-        extract('month', Expense.transaction_date) == month
-    ).order_by(Expense.transaction_date.desc()).order_by(Expense.created_at.desc()).all()
+        Expense.transaction_date >= start_date,
+        Expense.transaction_date < end_date
+    ).order_by(Expense.transaction_date.desc()).order_by(Expense.created_at.desc()))
+    expenses = result.scalars().all()
     
     return expenses
 
+@router.get("/list", response_model=ExpensePage)
+async def list_expenses(
+    from_date: Optional[date] = Query(None),
+    to_date: Optional[date] = Query(None),
+    transaction_type: Optional[TransactionType] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Keyset-paginated expenses, newest first; pass `next_cursor` back to continue"""
+    criteria = expense_filters(current_user.id, from_date, to_date, transaction_type)
+    try:
+        items, next_cursor = await db.run_sync(fetch_expense_page, criteria, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"items": items, "next_cursor": next_cursor}
+
 @router.get("/monthly-stats", response_model=MonthlyStats)
 async def get_monthly_stats(
-    year: int = Query(...),
-    month: int = Query(...),
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    credit_sum = db.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == current_user.id,
-        extract('year', Expense.transaction_date) == year,
-        extract('month', Expense.transaction_date) == month,
-        Expense.transaction_type == TransactionType.CREDIT
-    ).scalar() or 0
-    
-    debit_sum = db.query(func.sum(Expense.amount)).filter(
-        Expense.user_id == current_user.id,
-        extract('year', Expense.transaction_date) == year,
-        extract('month', Expense.transaction_date) == month,
-        Expense.transaction_type == TransactionType.DEBIT
-    ).scalar() or 0
+    totals = (await db.run_sync(get_period_totals, current_user.id, [(year, month)]))[(year, month)]
     
     return MonthlyStats(
-        total_credit=credit_sum,
-        total_debit=debit_sum,
-        net_amount=credit_sum - debit_sum
+        total_credit=totals["credit"],
+        total_debit=totals["debit"],
+        net_amount=totals["net"]
     )
 
 @router.get("/dashboard-stats")
 async def get_dashboard_stats(
+    months: Optional[int] = Query(None, ge=1, le=36),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Get last 4 months data in ascending order
-    current_date = datetime.now()
-    months_data = []
+    # Last N months in ascending order, aggregated in one query
+    periods = last_n_months(months or settings.DASHBOARD_MONTHS)
+    totals = await db.run_sync(get_period_totals, current_user.id, periods)
     
-    for i in range(3, -1, -1):  # 3, 2, 1, 0 for ascending order
-        if current_date.month > i:
-            month_date = datetime(current_date.year, current_date.month - i, 1)
-        else:
-            month_date = datetime(current_date.year - 1, 12 - (i - current_date.month), 1)
-        
-        credit_sum = db.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == current_user.id,
-            extract('year', Expense.transaction_date) == month_date.year,
-            extract('month', Expense.transaction_date) == month_date.month,
-            Expense.transaction_type == TransactionType.CREDIT
-        ).scalar() or 0
-        
-        debit_sum = db.query(func.sum(Expense.amount)).filter(
-            Expense.user_id == current_user.id,
-            extract('year', Expense.transaction_date) == month_date.year,
-            extract('month', Expense.transaction_date) == month_date.month,
-            Expense.transaction_type == TransactionType.DEBIT
-        ).scalar() or 0
-        
+    months_data = []
+    for year, month in periods:
+        period = totals[(year, month)]
         months_data.append({
-            "month": month_date.strftime("%B"),
-            "year": month_date.year,
-            "credit": float(credit_sum),
-            "debit": float(debit_sum),
-            "net": float(credit_sum - debit_sum)
+            "month": datetime(year, month, 1).strftime("%B"),
+            "year": year,
+            "credit": period["credit"],
+            "debit": period["debit"],
+            "net": period["net"]
         })
     
     return {"months": months_data}
@@ -134,39 +162,47 @@ async def update_expense(
     expense_id: int,
     expense: ExpenseCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_expense = db.query(Expense).filter(
+    result = await db.execute(select(Expense).where(
         Expense.id == expense_id,
         Expense.user_id == current_user.id
-    ).first()
+    ))
+    db_expense = result.scalars().first()
     
     if not db_expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
+    previous = await db.run_sync(collect_rollup_deltas, Expense.id == db_expense.id)
     db_expense.details = expense.details
     db_expense.amount = expense.amount
     db_expense.transaction_type = expense.transaction_type.value.lower()
     db_expense.transaction_date = expense.transaction_date
+    await db.flush()
+    current = await db.run_sync(collect_rollup_deltas, Expense.id == db_expense.id)
+    await db.run_sync(apply_rollup_deltas, added=current, removed=previous)
     
-    db.commit()
-    db.refresh(db_expense)
+    await db.commit()
+    await db.refresh(db_expense)
     return db_expense
 
 @router.delete("/{expense_id}")
 async def delete_expense(
     expense_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_expense = db.query(Expense).filter(
+    result = await db.execute(select(Expense).where(
         Expense.id == expense_id,
         Expense.user_id == current_user.id
-    ).first()
+    ))
+    db_expense = result.scalars().first()
     
     if not db_expense:
         raise HTTPException(status_code=404, detail="Expense not found")
     
-    db.delete(db_expense)
-    db.commit()
+    deltas = await db.run_sync(collect_rollup_deltas, Expense.id == db_expense.id)
+    await db.run_sync(apply_rollup_deltas, removed=deltas)
+    await db.delete(db_expense)
+    await db.commit()
     return {"message": "Expense deleted successfully"}
\ No newline at end of file
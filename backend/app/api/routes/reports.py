@@ -1,20 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import extract, and_
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import get_async_db, AsyncSessionLocal
 from app.api.routes.auth import get_current_user
 from app.models.user import User
-from app.models.expense import Expense, TransactionType
-from app.services.report_service import generate_pdf_report, generate_excel_report
+from app.models.expense import TransactionType
+from app.models.report_job import ReportJob
+from app.services.report_service import report_query
+from app.services.report_executor import ReportTimeout
+from app.services.report_cache import report_cache_key, cached_report
+from app.services.report_jobs import (
+    ReportJobLimit, build_report, enqueue_report_job, report_job_file, report_owner
+)
+from app.services.data_version import get_data_version
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Literal, Optional
+import csv
+import io
+import json
 import os
+import zlib
 
 router = APIRouter()
 
 
-
 @router.get("/pdf")
 async def generate_pdf(
     from_year: int = Query(..., ge=2000, le=2100),
@@ -23,7 +34,7 @@ async def generate_pdf(
     to_month: int = Query(..., ge=1, le=12),
     transaction_type: Optional[TransactionType] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Build date range
@@ -35,19 +46,16 @@ async def generate_pdf(
 
         print(f"Date range: {start_date} to {end_date}")
 
-        query = db.query(Expense).filter(
-            Expense.user_id == current_user.id,
-            Expense.transaction_date >= start_date,
-            Expense.transaction_date < end_date
-        )
-
-        if transaction_type:
-            query = query.filter(Expense.transaction_type == transaction_type)
-
-        expenses = query.order_by(Expense.transaction_date.desc()).order_by(Expense.created_at.desc()).all()
-        print(f"Found {len(expenses)} expenses")
-
-        file_path = generate_pdf_report(expenses, current_user)
+        # Read the version before the rows, so a concurrent write can only make the key newer than the data
+        type_value = transaction_type.value if transaction_type else None
+        version = await db.run_sync(get_data_version, current_user.id)
+        owner = report_owner(current_user)
+        cache_key = report_cache_key(owner, start_date, end_date, type_value, "pdf", version)
+        file_path = cached_report(cache_key, "pdf")
+        if file_path is None:
+            file_path = await build_report(
+                owner, "pdf", start_date, end_date, type_value, cache_key
+            )
 
         if not os.path.exists(file_path):
             raise HTTPException(status_code=500, detail="PDF file was not created")
@@ -60,6 +68,10 @@ async def generate_pdf(
             headers={"Content-Disposition": f'attachment; filename="{fileName}"'}
         )
 
+    except HTTPException:
+        raise
+    except ReportTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"PDF API error: {e}")
         import traceback
@@ -74,10 +86,8 @@ async def generate_excel(
     to_month: int = Query(...),
     transaction_type: Optional[TransactionType] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(Expense).filter(Expense.user_id == current_user.id)
-    
     # Date range filter
     from_date = datetime(from_year, from_month, 1)
     if to_month == 12:
@@ -85,20 +95,215 @@ async def generate_excel(
     else:
         to_date = datetime(to_year, to_month + 1, 1)
     
-    query = query.filter(
-        Expense.transaction_date >= from_date,
-        Expense.transaction_date < to_date
-    )
-    
-    if transaction_type:
-        query = query.filter(Expense.transaction_type == transaction_type)
-    
-    expenses = query.order_by(Expense.transaction_date.desc()).all()
-    
-    file_path = generate_excel_report(expenses, current_user)
+    type_value = transaction_type.value if transaction_type else None
+    version = await db.run_sync(get_data_version, current_user.id)
+    owner = report_owner(current_user)
+    cache_key = report_cache_key(owner, from_date, to_date, type_value, "xlsx", version)
+    file_path = cached_report(cache_key, "xlsx")
+    if file_path is None:
+        try:
+            file_path = await build_report(
+                owner, "xlsx", from_date, to_date, type_value, cache_key
+            )
+        except ReportTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
     fileName = f"report_{current_user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     return FileResponse(
         file_path,
         media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         filename=fileName
-    )
\ No newline at end of file
+    )
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+def _export_range(from_year: int, from_month: int, to_year: int, to_month: int):
+    start_date = datetime(from_year, from_month, 1)
+    if to_month == 12:
+        end_date = datetime(to_year + 1, 1, 1)
+    else:
+        end_date = datetime(to_year, to_month + 1, 1)
+    return start_date, end_date
+
+def _csv_chunk(rows, currency: str, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(["date", "details", "type", "amount", "currency"])
+    for transaction_date, details, txn_type, amount in rows:
+        writer.writerow([transaction_date.isoformat(), details, txn_type.value, amount, currency])
+    return buffer.getvalue()
+
+def _ndjson_chunk(rows, currency: str) -> str:
+    return "".join(
+        json.dumps({
+            "transaction_date": transaction_date.isoformat(),
+            "details": details,
+            "transaction_type": txn_type.value,
+            "amount": amount,
+            "currency": currency
+        }) + "\n"
+        for transaction_date, details, txn_type, amount in rows
+    )
+
+async def _stream_export(query, fmt: str, currency: str, compress: bool) -> AsyncIterator[bytes]:
+    """Encode rows one server-side-cursor partition at a time"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        if compressor is None:
+            return data
+        # Sync-flush so each partition reaches the client straight away
+        return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    if fmt == "csv":
+        yield encode(_csv_chunk((), currency, header=True))
+
+    # The request's session is closed once the route returns, so the stream owns its own
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=settings.REPORT_YIELD_PER))
+        async for rows in result.partitions():
+            chunk = _csv_chunk(rows, currency) if fmt == "csv" else _ndjson_chunk(rows, currency)
+            yield encode(chunk)
+
+    if compressor is not None:
+        yield compressor.flush()
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip; q=0 refuses a coding"""
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip()] = quality
+    if "gzip" in qualities:
+        return qualities["gzip"] > 0
+    return qualities.get("*", 0.0) > 0
+
+def _export_response(request: Request, fmt: str, current_user: User, query) -> StreamingResponse:
+    compress = _accepts_gzip(request.headers.get("accept-encoding", ""))
+    fileName = f"report_{current_user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    headers = {"Content-Disposition": f'attachment; filename="{fileName}"', "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _stream_export(query, fmt, current_user.currency, compress),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers=headers
+    )
+
+@router.get("/csv")
+async def export_csv(
+    request: Request,
+    from_year: int = Query(..., ge=2000, le=2100),
+    from_month: int = Query(..., ge=1, le=12),
+    to_year: int = Query(..., ge=2000, le=2100),
+    to_month: int = Query(..., ge=1, le=12),
+    transaction_type: Optional[TransactionType] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream transactions as CSV without writing a file (gzip when the client accepts it)"""
+    start_date, end_date = _export_range(from_year, from_month, to_year, to_month)
+    return _export_response(request, "csv", current_user, report_query(current_user.id, start_date, end_date, transaction_type))
+
+@router.get("/ndjson")
+async def export_ndjson(
+    request: Request,
+    from_year: int = Query(..., ge=2000, le=2100),
+    from_month: int = Query(..., ge=1, le=12),
+    to_year: int = Query(..., ge=2000, le=2100),
+    to_month: int = Query(..., ge=1, le=12),
+    transaction_type: Optional[TransactionType] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream transactions as JSON lines without writing a file (gzip when the client accepts it)"""
+    start_date, end_date = _export_range(from_year, from_month, to_year, to_month)
+    return _export_response(request, "ndjson", current_user, report_query(current_user.id, start_date, end_date, transaction_type))
+
+
+class ReportJobRequest(BaseModel):
+    format: Literal["pdf", "xlsx"]
+    from_year: int = Field(..., ge=2000, le=2100)
+    from_month: int = Field(..., ge=1, le=12)
+    to_year: int = Field(..., ge=2000, le=2100)
+    to_month: int = Field(..., ge=1, le=12)
+    transaction_type: Optional[TransactionType] = None
+
+class ReportJobStatus(BaseModel):
+    id: str
+    format: str
+    status: str
+    progress: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
+def _job_status(job: ReportJob) -> dict:
+    return {
+        "id": job.id,
+        "format": job.format,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "download_url": f"/api/reports/jobs/{job.id}/download" if job.status == "succeeded" else None,
+    }
+
+async def _get_job(db: AsyncSession, job_id: str, user_id: int) -> ReportJob:
+    job = await db.get(ReportJob, job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+@router.post("/jobs", response_model=ReportJobStatus, status_code=202)
+async def create_report_job(
+    job_request: ReportJobRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue a PDF/Excel report; identical requests share one job"""
+    start_date, end_date = _export_range(job_request.from_year, job_request.from_month, job_request.to_year, job_request.to_month)
+    try:
+        job = await enqueue_report_job(
+            db, current_user, job_request.format, start_date, end_date,
+            job_request.transaction_type.value if job_request.transaction_type else None
+        )
+    except ReportJobLimit as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return _job_status(job)
+
+@router.get("/jobs/{job_id}", response_model=ReportJobStatus)
+async def get_report_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return _job_status(await _get_job(db, job_id, current_user.id))
+
+@router.get("/jobs/{job_id}/download")
+async def download_report_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    job = await _get_job(db, job_id, current_user.id)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Report is {job.status}")
+    file_path = report_job_file(job)
+    if file_path is None:
+        raise HTTPException(status_code=410, detail="Report file has expired; request it again")
+
+    fileName = f"report_{current_user.id}_{job.created_at.strftime('%Y%m%d_%H%M%S')}.{job.format}"
+    media_type = 'application/pdf' if job.format == "pdf" else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return FileResponse(path=file_path, media_type=media_type, filename=fileName)
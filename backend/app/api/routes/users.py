@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.api.routes.auth import get_current_user
 from app.models.user import User
 from pydantic import BaseModel
@@ -41,13 +41,14 @@ async def get_profile(current_user: User = Depends(get_current_user)):
 async def update_profile(
     profile: UserProfile,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    # current_user may come from the user cache; edit the session's copy
+    user = await db.get(User, current_user.id)
     for field, value in profile.dict().items():
-        setattr(current_user, field, value)
+        setattr(user, field, value)
     
-    current_user.is_profile_complete = True
-    db.commit()
-    db.refresh(current_user)
+    user.is_profile_complete = True
+    await db.commit()
     
     return {"message": "Profile updated successfully"}
\ No newline at end of file
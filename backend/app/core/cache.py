@@ -0,0 +1,154 @@
+"""
+Small key/value caches with TTL and LRU eviction.
+
+`MemoryCache` lives inside one worker process. `RedisCache` is shared by
+every worker pointed at the same Redis, so a delete in one process is seen
+by all of them. Pick one with `create_cache()` and the CACHE_BACKEND setting.
+"""
+
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    # True when calls do network I/O; async code should run them in a thread
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+def _decode(obj):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+class RedisCache(CacheBackend):
+    """Cache shared between workers; values are stored as JSON under a namespace.
+    Redis evicts by its own maxmemory policy, so `max_entries` does not apply.
+    Redis errors are logged and treated as cache misses."""
+
+    blocking = True
+
+    def __init__(self, namespace: str, url: str):
+        import redis  # Only needed when CACHE_BACKEND=redis
+
+        self.namespace = namespace
+        self._errors = redis.RedisError
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def _key(self, key: str) -> str:
+        return f"{settings.APP_NAME}:{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self._client.get(self._key(key))
+        except self._errors as e:
+            logger.warning(f"Redis cache get failed: {e}")
+            return None
+        if raw is None:
+            return None
+        return json.loads(raw, object_hook=_decode)
+
+    def set(self, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        try:
+            self._client.set(self._key(key), json.dumps(value, default=_encode), px=int(ttl * 1000))
+        except self._errors as e:
+            logger.warning(f"Redis cache set failed: {e}")
+
+    def delete(self, key: str):
+        try:
+            self._client.delete(self._key(key))
+        except self._errors as e:
+            logger.error(f"Redis cache delete failed, entry may be stale until its TTL: {e}")
+
+    def clear(self):
+        try:
+            for key in self._client.scan_iter(match=self._key("*")):
+                self._client.delete(key)
+        except self._errors as e:
+            logger.error(f"Redis cache clear failed: {e}")
+
+
+def create_cache(namespace: str, max_entries: int, backend: Optional[str] = None) -> CacheBackend:
+    """Build the cache configured by CACHE_BACKEND (memory or redis)"""
+    backend = (backend or settings.CACHE_BACKEND).lower()
+    if backend == "redis":
+        return RedisCache(namespace, settings.REDIS_URL)
+    return MemoryCache(max_entries)
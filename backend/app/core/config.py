@@ -7,15 +7,38 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: str = ""  # Derived from DATABASE_URL (asyncpg/aiosqlite) when empty
     DB_TYPE: str = "postgresql"  # postgresql or sqlite
     POSTGRES_USER: str = ""
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
     
+    # Connection pool (PostgreSQL engines)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    DB_SLOW_CHECKOUT_SECONDS: float = 10.0  # Log connections held longer than this
+    DB_POOL_TRACK_CALLERS: bool = True  # Record the call site of each checkout
+    
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 hours
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_WORKERS: int = 2  # Threads dedicated to Argon2 hashing/verification
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # Waiting hashes beyond this get 503
+    
+    # Caches
+    CACHE_BACKEND: str = "memory"  # memory (per worker) or redis (shared by all workers)
+    REDIS_URL: str = "redis://localhost:6379/0"
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
     
     # Email
     SMTP_HOST: str
@@ -28,6 +51,77 @@ class Settings(BaseSettings):
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OPENAI_API_KEY: str = ""
     GEMINI_API_KEY: str = ""
+    LLM_CONNECT_TIMEOUT: float = 10.0
+    LLM_KEEPALIVE_EXPIRY: float = 60.0  # Seconds an idle pooled connection is kept open
+    LLM_HTTP2: bool = True  # Used for cloud providers when the h2 package is installed
+    OLLAMA_MODEL: str = "gemma3:1b"
+    OLLAMA_KEEP_ALIVE: str = "30m"  # How long Ollama keeps the model loaded after a request ("-1" = forever)
+    OLLAMA_NUM_THREAD: int = 0  # CPU threads for generation; 0 lets Ollama decide
+    OLLAMA_TIMEOUT: float = 120.0
+    OLLAMA_WARMUP_TIMEOUT: float = 300.0  # Loading the model from disk on a cold start
+    OLLAMA_WARMUP_ON_STARTUP: bool = True
+    OLLAMA_KEEP_WARM_ENABLED: bool = True  # Ping the model during business hours so it is never unloaded
+    OLLAMA_KEEP_WARM_DAYS: str = "mon-fri"  # Cron day_of_week
+    OLLAMA_KEEP_WARM_HOURS: str = "7-20"  # Cron hour, server local time
+    OLLAMA_KEEP_WARM_MINUTES: int = 10  # Must stay below OLLAMA_KEEP_ALIVE
+    OLLAMA_NUM_CTX: int = 8192  # Context window requested from Ollama; bounds the prompt budget
+    OLLAMA_NUM_PREDICT: int = 600  # Longest answer generated
+    OLLAMA_MAX_CONNECTIONS: int = 10
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 5
+    OPENAI_TIMEOUT: float = 60.0
+    OPENAI_CONTEXT_TOKENS: int = 16385
+    OPENAI_MAX_TOKENS: int = 500
+    OPENAI_MAX_CONNECTIONS: int = 20
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    GEMINI_TIMEOUT: float = 60.0
+    GEMINI_CONTEXT_TOKENS: int = 32768  # Well below the model's window: longer prompts only add latency and cost
+    GEMINI_MAX_TOKENS: int = 500
+    GEMINI_MAX_CONNECTIONS: int = 20
+    GEMINI_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    AI_CONTEXT_MONTHS: int = 12  # Monthly totals and top spending cover this many months
+    AI_CONTEXT_RECENT_ROWS: int = 600  # Transactions listed for Ollama
+    AI_CONTEXT_RECENT_ROWS_COMPACT: int = 20  # Transactions listed for online APIs
+    AI_CONTEXT_TOP_DETAILS: int = 10
+    AI_CONTEXT_RELEVANT_ROWS: int = 60  # Transactions matching the question, found through the expense index (Ollama)
+    AI_CONTEXT_RELEVANT_ROWS_COMPACT: int = 10  # Same, for online APIs
+    EXPENSE_INDEX_MAX_USERS: int = 500  # Per-process retrieval indexes kept in memory
+    EXPENSE_INDEX_REBUILD_SECONDS: int = 6 * 3600  # Full rebuild backstop for rows deleted since the last one
+    AI_PROMPT_SAFETY_TOKENS: int = 256  # Margin for token estimation error
+    AI_PROMPT_QUESTION_TOKENS: int = 1500  # Reserved for the question and the transactions matching it
+    AI_PROMPT_PREFIX_CACHE_TTL_SECONDS: int = 3600
+    AI_PROMPT_PREFIX_CACHE_MAX_ENTRIES: int = 500
+    AI_ANSWER_CACHE_ENABLED: bool = True  # Reuse answers to repeated questions until the user's expenses change
+    AI_ANSWER_CACHE_TTL_SECONDS: int = 3600
+    AI_ANSWER_CACHE_MAX_ENTRIES: int = 5000
+    
+    # Dashboard
+    DASHBOARD_MONTHS: int = 4  # Months shown by /api/expenses/dashboard-stats
+    USE_MONTHLY_ROLLUPS: bool = True  # Read stats from monthly_rollups instead of raw expenses
+    
+    # Group commit for POST /api/expenses/ (opt-in)
+    EXPENSE_GROUP_COMMIT: bool = False
+    GROUP_COMMIT_MAX_WAIT_MS: int = 5  # How long the first insert waits for company
+    GROUP_COMMIT_MAX_BATCH: int = 100
+    
+    # Bulk import
+    IMPORT_BATCH_SIZE: int = 1000  # Rows per INSERT batch
+    IMPORT_MAX_ERRORS: int = 500  # Row errors returned in the import report
+    
+    # Reports
+    REPORT_WORKERS: int = 2  # Report builder processes; also the cap on concurrent builds
+    REPORT_TIMEOUT_SECONDS: int = 120
+    PDF_LARGE_REPORT_ROWS: int = 2000  # Above this, PDFs use per-month chunked tables with subtotals
+    PDF_TABLE_CHUNK_ROWS: int = 500
+    REPORT_YIELD_PER: int = 1000  # Rows fetched per round trip when streaming Excel exports
+    REPORT_CACHE_ENABLED: bool = True  # Reuse PDF/Excel files until the user's expenses change
+    REPORT_CACHE_DIR: str = ""  # Defaults to app/report_cache
+    REPORT_CACHE_MAX_FILES: int = 500
+    REPORT_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    REPORT_JOB_MAX_RUNNING: int = 4  # Background report jobs running at once, across all API processes
+    REPORT_JOB_MAX_RUNNING_PER_USER: int = 1
+    REPORT_JOB_MAX_PENDING_PER_USER: int = 5  # Queued plus running; more gets 429
+    REPORT_JOB_MAX_ATTEMPTS: int = 3  # Restarts of a job whose process died
+    REPORT_JOB_POLL_SECONDS: int = 5
     
     # File Retention
     FILE_RETENTION_DAYS: int = 7
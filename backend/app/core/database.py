@@ -1,20 +1,42 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.db_pool import pool_engine_kwargs, monitor_engine
 import os
 
+def _async_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver (asyncpg / aiosqlite)"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
 # Database URL configuration based on DB_TYPE
 if settings.DB_TYPE == "sqlite":
     # SQLite for lightweight deployment
     DATABASE_URL = "sqlite:///./expense_advisor.db"
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_url(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
 else:
     # PostgreSQL for production
     DATABASE_URL = settings.DATABASE_URL
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, **pool_engine_kwargs())
+    ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_url(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_engine_kwargs(async_engine=True))
+
+monitor_engine("sync", engine)
+monitor_engine("async", async_engine.sync_engine)
 
+# Sync sessions are kept for the scheduler jobs and other non-async callers
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
 def get_db():
@@ -22,4 +44,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,202 @@
+"""
+Connection pool instrumentation: pool gauges, wait counters and a
+checkout tracker that reports sessions held too long or never returned.
+"""
+
+import logging
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = str(Path(__file__).resolve().parent.parent)
+
+# "METHOD /path" of the HTTP request currently using the database, if any
+_request_label: ContextVar[Optional[str]] = ContextVar("db_request_label", default=None)
+
+
+class _PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.long_held = 0
+        # id(connection record) -> (checkout time, call site)
+        self.held: Dict[int, Tuple[float, str]] = {}
+
+
+class _MonitoredPoolMixin:
+    """Counts checkouts that had to wait for a free connection"""
+
+    def connect(self):
+        stats = _stats_for(self)
+        # Every monitored pool is sized by pool_engine_kwargs()
+        if self.checkedout() < self.size() + settings.DB_MAX_OVERFLOW:
+            return super().connect()
+
+        started = time.monotonic()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with stats.lock:
+                stats.timeouts += 1
+            logger.error(f"Connection pool exhausted: {_describe(self)}")
+            raise
+        finally:
+            with stats.lock:
+                stats.waits += 1
+                stats.wait_seconds += time.monotonic() - started
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same stats
+        new_pool = super().recreate()
+        _pool_stats[id(new_pool)] = _stats_for(self)
+        return new_pool
+
+
+class MonitoredQueuePool(_MonitoredPoolMixin, QueuePool):
+    pass
+
+
+class MonitoredAsyncQueuePool(_MonitoredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+_pool_stats: Dict[int, _PoolStats] = {}
+_monitored_engines = {}
+
+
+def _stats_for(pool) -> _PoolStats:
+    stats = _pool_stats.get(id(pool))
+    if stats is None:
+        stats = _pool_stats.setdefault(id(pool), _PoolStats())
+    return stats
+
+
+def _describe(pool) -> str:
+    return pool.status() if hasattr(pool, "status") else type(pool).__name__
+
+
+def _call_site() -> str:
+    """Innermost application frame plus the HTTP request that triggered the checkout"""
+    site = None
+    if settings.DB_POOL_TRACK_CALLERS:
+        for frame in reversed(traceback.extract_stack(limit=40)):
+            if frame.filename.startswith(APP_DIR) and frame.filename != __file__:
+                site = f"{frame.filename[len(APP_DIR) + 1:]}:{frame.lineno} in {frame.name}"
+                break
+    parts = [p for p in (_request_label.get(), site) if p]
+    return " | ".join(parts) or "unknown"
+
+
+def pool_engine_kwargs(async_engine: bool = False) -> dict:
+    """create_engine() pool arguments built from Settings"""
+    return {
+        "poolclass": MonitoredAsyncQueuePool if async_engine else MonitoredQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def monitor_engine(name: str, engine):
+    """Attach checkout/checkin tracking to a (sync) engine's pool"""
+    pool = engine.pool
+    stats = _stats_for(pool)
+    _monitored_engines[name] = engine
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with stats.lock:
+            stats.checkouts += 1
+            stats.held[id(connection_record)] = (time.monotonic(), _call_site())
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        with stats.lock:
+            entry = stats.held.pop(id(connection_record), None)
+        if entry is None:
+            return
+        held_for = time.monotonic() - entry[0]
+        if held_for > settings.DB_SLOW_CHECKOUT_SECONDS:
+            with stats.lock:
+                stats.long_held += 1
+            logger.warning(
+                f"[{name}] connection held for {held_for:.1f}s, checked out at {entry[1]}"
+            )
+
+    @event.listens_for(pool, "detach")
+    def _on_detach(dbapi_connection, connection_record):
+        with stats.lock:
+            stats.held.pop(id(connection_record), None)
+
+    return engine
+
+
+def report_long_held_connections():
+    """Log connections checked out longer than the threshold and not yet returned"""
+    now = time.monotonic()
+    threshold = settings.DB_SLOW_CHECKOUT_SECONDS
+    for name, engine in _monitored_engines.items():
+        stats = _stats_for(engine.pool)
+        with stats.lock:
+            held = list(stats.held.values())
+        for checked_out_at, site in held:
+            age = now - checked_out_at
+            if age > threshold:
+                logger.warning(
+                    f"[{name}] connection not returned after {age:.1f}s, checked out at {site}"
+                )
+
+
+def pool_metrics() -> dict:
+    """Gauges and counters for every monitored pool"""
+    now = time.monotonic()
+    metrics = {}
+    for name, engine in _monitored_engines.items():
+        pool = engine.pool
+        stats = _stats_for(pool)
+        with stats.lock:
+            oldest = max((now - t for t, _ in stats.held.values()), default=0.0)
+            metrics[name] = {
+                "pool_class": type(pool).__name__,
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "in_use": pool.checkedout() if hasattr(pool, "checkedout") else len(stats.held),
+                "idle": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "checkouts": stats.checkouts,
+                "waits": stats.waits,
+                "wait_seconds_total": round(stats.wait_seconds, 3),
+                "timeouts": stats.timeouts,
+                "long_held": stats.long_held,
+                "oldest_checkout_seconds": round(oldest, 3),
+            }
+    return metrics
+
+
+class CheckoutLabelMiddleware:
+    """ASGI middleware that tags pool checkouts with the current request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_label.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_label.reset(token)
@@ -1,11 +1,24 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
 #pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Pinning min/max rounds makes hashes with any other cost "need update", so
+# they are rehashed on the next successful login after the settings change.
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=settings.ARGON2_TIME_COST,
+    argon2__min_rounds=settings.ARGON2_TIME_COST,
+    argon2__max_rounds=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -13,6 +26,58 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+
+class PasswordHashingBusy(RuntimeError):
+    pass
+
+
+# Argon2 releases the GIL, so a few dedicated threads keep it off the event loop
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_pending = 0
+_hash_lock = threading.Lock()
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+        )
+    return _hash_executor
+
+def _release_hash_slot(_future):
+    global _hash_pending
+    with _hash_lock:
+        _hash_pending -= 1
+
+async def _run_hashing(fn, *args):
+    """Run fn on the hashing pool, refusing work once the queue is full"""
+    global _hash_pending
+    with _hash_lock:
+        if _hash_pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE:
+            raise PasswordHashingBusy("Too many password hashing requests in progress")
+        _hash_pending += 1
+    try:
+        future = _get_hash_executor().submit(fn, *args)
+    except Exception:
+        _release_hash_slot(None)
+        raise
+    # The slot is freed when the thread finishes, even if the caller is cancelled
+    future.add_done_callback(_release_hash_slot)
+    return await asyncio.wrap_future(future)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify off the event loop; also returns a new hash when the stored one uses outdated parameters"""
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def shutdown_password_hashing():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
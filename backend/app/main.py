@@ -2,9 +2,18 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.config import settings
-from app.api.routes import auth, users, expenses, reports, ai_chat, notifications, static_files, expense_crud
+from app.core.db_pool import CheckoutLabelMiddleware, pool_metrics
+from app.core.security import shutdown_password_hashing
+from app.api.routes import auth, users, expenses, reports, ai_chat, notifications, static_files, expense_crud, expense_import
 from app.services.scheduler_service import start_scheduler, stop_scheduler
+from app.services.group_commit import expense_committer
+from app.services.report_executor import shutdown_report_pool
+from app.services.report_jobs import report_job_runner
+from app.services.llm_providers import start_llm_providers, warm_up_llm_provider, close_llm_providers, get_llm_provider
+from app.services.answer_cache import answer_cache_metrics
+from app.services.expense_index import expense_index_metrics
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
 
 
@@ -12,9 +21,22 @@ import os
 async def lifespan(app: FastAPI):
     # Startup
     start_scheduler()
+    report_job_runner.start()
+    start_llm_providers()
+    # Load the model in the background; the API serves requests meanwhile
+    llm_warm_up = None
+    if settings.LLM_PROVIDER == "ollama" and settings.OLLAMA_WARMUP_ON_STARTUP:
+        llm_warm_up = asyncio.create_task(warm_up_llm_provider())
     yield
     # Shutdown
+    if llm_warm_up is not None:
+        llm_warm_up.cancel()
+    await close_llm_providers()
+    await report_job_runner.close()
+    await expense_committer.close()
     stop_scheduler()
+    shutdown_password_hashing()
+    shutdown_report_pool()
 
 app = FastAPI(title=settings.APP_NAME, version="1.0.0", lifespan=lifespan)
 
@@ -30,6 +52,8 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 app.mount("/static/reports", StaticFiles(directory=REPORT_DIR), name="reports")
 
 
+app.add_middleware(CheckoutLabelMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -46,6 +70,7 @@ app.include_router(ai_chat.router, prefix="/api/ai", tags=["ai"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["notifications"])
 app.include_router(static_files.router, tags=["static"])
 app.include_router(expense_crud.router, prefix="/api/expenses", tags=["expense-crud"])
+app.include_router(expense_import.router, prefix="/api/expenses", tags=["expense-import"])
 
 @app.get("/")
 async def root():
@@ -53,4 +78,28 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/health/db-pool")
+async def db_pool_health():
+    return pool_metrics()
+
+@app.get("/health/group-commit")
+async def group_commit_health():
+    return expense_committer.metrics()
+
+@app.get("/health/report-jobs")
+async def report_jobs_health():
+    return report_job_runner.metrics()
+
+@app.get("/health/llm")
+async def llm_health():
+    return get_llm_provider().metrics()
+
+@app.get("/health/ai-cache")
+async def ai_cache_health():
+    return answer_cache_metrics()
+
+@app.get("/health/expense-index")
+async def expense_index_health():
+    return expense_index_metrics()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -22,9 +22,22 @@ class Expense(Base):
     transaction_date = Column(DateTime(timezone=True), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    idempotency_key = Column(String(128), nullable=True)  # Client-supplied Idempotency-Key header
     
     user = relationship("User", back_populates="expenses")
 
+    __table_args__ = (
+        # Serves per-user month/range lookups in the order the UI lists them
+        Index(
+            "ix_expenses_user_date_created",
+            "user_id",
+            transaction_date.desc(),
+            created_at.desc(),
+        ),
+        # Retried POSTs carrying the same key resolve to the original row
+        Index("uq_expenses_user_idempotency_key", "user_id", "idempotency_key", unique=True),
+    )
+
 # Add relationship to User model
 from app.models.user import User
 User.expenses = relationship("Expense", back_populates="user")
\ No newline at end of file
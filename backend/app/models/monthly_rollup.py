@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class MonthlyRollup(Base):
+    """Per-user monthly totals, kept in step with every expense write"""
+    __tablename__ = "monthly_rollups"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    transaction_type = Column(String(10), primary_key=True)  # "credit" or "debit"
+    total_amount = Column(Float, nullable=False, default=0.0)
+    txn_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
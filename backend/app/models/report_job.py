@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, text
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class ReportJob(Base):
+    """A queued PDF/Excel report build, persisted so it survives restarts"""
+    __tablename__ = "report_jobs"
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    format = Column(String(8), nullable=False)  # "pdf" or "xlsx"
+    start_date = Column(DateTime(timezone=True), nullable=False)
+    end_date = Column(DateTime(timezone=True), nullable=False)
+    transaction_type = Column(String(10), nullable=True)
+    cache_key = Column(String(64), nullable=False)  # Report cache key, also used to de-duplicate jobs
+    status = Column(String(16), nullable=False, default="queued")  # queued, running, succeeded, failed
+    progress = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    file_path = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_report_jobs_user_cache_key", "user_id", "cache_key"),
+        Index("ix_report_jobs_status_created", "status", "created_at"),
+        # At most one queued or running job per report, even for concurrent requests
+        Index(
+            "uq_report_jobs_pending_cache_key",
+            "user_id",
+            "cache_key",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
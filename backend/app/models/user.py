@@ -22,7 +22,8 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-def get_user_details(user_id: int):
-    db = SessionLocal()
-    user = db.query(User).filter(User.id == user_id).first()
-    return user
\ No newline at end of file
+def get_user_details(user_id: int, db=None):
+    if db is not None:
+        return db.query(User).filter(User.id == user_id).first()
+    with SessionLocal() as session:
+        return session.query(User).filter(User.id == user_id).first()
\ No newline at end of file
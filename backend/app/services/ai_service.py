@@ -1,107 +1,79 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 from sqlalchemy.orm import Session
-from app.models.expense import Expense, TransactionType
+from starlette.concurrency import run_in_threadpool
+from app.models.expense import Expense
 from app.core.config import settings
 from datetime import datetime
-from app.models.user import get_user_details
+from typing import NamedTuple, Optional
 from pathlib import Path
-from app.services.llm_providers import get_llm_provider
+from app.services.answer_cache import answer_cache_key, cache_answer_async, get_cached_answer
+from app.services.chat_intents import answer_intent, parse_intent
+from app.services.data_version import get_data_version
+from app.services.llm_providers import PROVIDER_ERROR_RESPONSES, get_llm_provider
+from app.services.prompt_builder import build_prompt
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 STATIC_DIR = BASE_DIR / "static"
 STATIC_DIR.mkdir(exist_ok=True)
 
-def create_prompt_for_provider(message: str, user_id: int, db: Session) -> str:
-    expenses = db.query(Expense).filter(Expense.user_id == user_id).all()
-    user = get_user_details(user_id)
-    currency = user.currency or "INR"
-
-    total_credit = sum(e.amount for e in expenses if e.transaction_type == TransactionType.CREDIT)
-    total_debit = sum(e.amount for e in expenses if e.transaction_type == TransactionType.DEBIT)
-    net = total_credit - total_debit
-
-    if settings.LLM_PROVIDER == "ollama":
-        # Full context for local Ollama
-        toon_lines = []
-        for e in expenses:
-            date_str = e.transaction_date.strftime("%Y-%m-%d")
-            ttype = "C" if e.transaction_type == TransactionType.CREDIT else "D"
-            amount = f"{e.amount:.2f}"
-            details = (e.details or "No details").strip().replace("|", "/")
-            toon_lines.append(f"{date_str}|{ttype}|{amount}|{details}")
-
-        full_context = "\n".join(toon_lines)
-        summary = f"Income: {total_credit:.2f} {currency} | Expenses: {total_debit:.2f} {currency} | Net: {net:.2f} {currency}"
-        
-        # Truncate if too large
-        if len(full_context) > 30000:
-            context_to_use = "\n".join(toon_lines[-600:])
-            note = "\n(Showing recent 600 transactions)"
-        else:
-            context_to_use = full_context
-            note = ""
-
-        return f"""You are a financial advisor. Use ONLY the data below.
-
-=== USER FINANCIAL DATA ===
-{summary}
-
-Transactions (date|C/D|amount|details):
-{context_to_use}{note}
-
-Legend: C=Income, D=Expense, amounts in {currency}
-
-RULES:
-- Use exact data only
-- Never invent transactions
-- Be accurate and concise
-
-Question: {message}
-
-Answer:"""
-
-    else:
-        # Compact summary for online APIs
-        recent_expenses = expenses[-20:] if len(expenses) > 20 else expenses
-        
-        summary_text = f"""Financial Summary:
-- Total Income: {total_credit:.2f} {currency}
-- Total Expenses: {total_debit:.2f} {currency}
-- Net Balance: {net:.2f} {currency}
-- Total Transactions: {len(expenses)}
-
-Recent Transactions:"""
-        
-        for e in recent_expenses:
-            ttype = "Income" if e.transaction_type == TransactionType.CREDIT else "Expense"
-            summary_text += f"\n- {e.transaction_date.strftime('%Y-%m-%d')}: {ttype} {e.amount:.2f} {currency} ({e.details or 'No details'})"
-
-        return f"""You are a personal finance advisor. Based on this user's financial data, answer their question concisely.
-
-{summary_text}
-
-User Question: {message}
-
-Provide helpful financial advice based on the data above:"""
+def check_ai_response(response: str) -> str:
+    """Final answer shown to the user, after the hallucination safety check"""
+    bad_phrases = ["approximately", "around", "about", "roughly", "seems", "probably"]
+    if any(phrase in response.lower() for phrase in bad_phrases):
+        return "I can only provide exact figures from your records."
+    
+    return response or "No matching data found in your records."
+
+def cacheable_answer(answer: str) -> bool:
+    """Only real model answers are cached, never provider failures"""
+    return bool(answer) and answer not in PROVIDER_ERROR_RESPONSES
+
+class PreparedChat(NamedTuple):
+    source: str  # sql (answered from aggregates), cache or llm
+    answer: Optional[str]  # Set unless source is llm
+    prompt: Optional[str]  # Set when source is llm
+    cache_key: Optional[str]
+
+class ChatAnswer(NamedTuple):
+    response: str
+    source: str
+
+def prepare_chat(message: str, user_id: int, db: Session) -> PreparedChat:
+    """Route a chat message: aggregate questions are answered from SQL, repeated
+    questions from the answer cache, and everything else gets an LLM prompt"""
+    intent = parse_intent(message)
+    answer = answer_intent(intent, user_id, db) if intent is not None else None
+    if answer is not None:
+        return PreparedChat("sql", answer, None, None)
 
-async def get_ai_response(message: str, user_id: int, db: Session) -> str:
-    prompt = create_prompt_for_provider(message, user_id, db)
+    provider = get_llm_provider()
+    data_version = get_data_version(db, user_id)
+    cache_key = answer_cache_key(user_id, message, provider, data_version)
+    cached = get_cached_answer(cache_key)
+    if cached is not None:
+        return PreparedChat("cache", cached, None, cache_key)
+    return PreparedChat("llm", None, build_prompt(message, user_id, db, provider, data_version), cache_key)
+
+async def get_ai_response(message: str, user_id: int, db: Session) -> ChatAnswer:
+    # SQL, the answer cache and the retrieval index all block
+    chat = await run_in_threadpool(prepare_chat, message, user_id, db)
+    if chat.answer is not None:
+        return ChatAnswer(chat.answer, chat.source)
     provider = get_llm_provider()
     
     try:
-        response = await provider.generate_response(prompt)
+        response = await provider.generate_response(chat.prompt)
         
         # Safety check for hallucination
-        bad_phrases = ["approximately", "around", "about", "roughly", "seems", "probably"]
-        if any(phrase in response.lower() for phrase in bad_phrases):
-            return "I can only provide exact figures from your records."
-        
-        return response or "No matching data found in your records."
+        answer = check_ai_response(response)
+        if cacheable_answer(response):
+            await cache_answer_async(chat.cache_key, answer)
+        return ChatAnswer(answer, chat.source)
     
     except Exception as e:
         print(f"AI service error: {e}")
-        return "Sorry, I'm having connection issues. Please try again."
+        return ChatAnswer("Sorry, I'm having connection issues. Please try again.", chat.source)
 
 async def generate_chart(message: str, user_id: int, db: Session) -> str:
     expenses = db.query(Expense).filter(Expense.user_id == user_id).all()
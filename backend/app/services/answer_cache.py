@@ -0,0 +1,80 @@
+"""
+Exact-match cache of AI chat answers.
+
+An answer is keyed by the user, the normalized question, the provider and
+model that produced it, the user's data version and today's date. Any expense
+write bumps the data version, so answers about the old data are never served
+again; they age out through the TTL and LRU eviction. The date keeps relative
+questions ("this month", "today") from outliving the day they were asked.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from datetime import date
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from app.core.cache import create_cache
+from app.core.config import settings
+from app.services.llm_providers import LLMProvider
+
+_answer_cache = create_cache("ai_answers", settings.AI_ANSWER_CACHE_MAX_ENTRIES)
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+_stats_lock = threading.Lock()  # Lookups run in threadpool workers
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_question(message: str) -> str:
+    """Case, punctuation and spacing do not change what is being asked"""
+    return " ".join(_PUNCTUATION.sub(" ", message.lower()).split())
+
+
+def answer_cache_key(user_id: int, message: str, provider: LLMProvider, data_version: int) -> str:
+    identity = json.dumps([
+        user_id, normalize_question(message), provider.name, provider.model,
+        data_version, date.today().isoformat()
+    ])
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def get_cached_answer(key: str) -> Optional[str]:
+    if not settings.AI_ANSWER_CACHE_ENABLED:
+        return None
+    answer = _answer_cache.get(key)
+    with _stats_lock:
+        _stats["hits" if answer is not None else "misses"] += 1
+    return answer
+
+
+async def get_cached_answer_async(key: str) -> Optional[str]:
+    if not _answer_cache.blocking:
+        return get_cached_answer(key)
+    return await run_in_threadpool(get_cached_answer, key)
+
+
+def cache_answer(key: str, answer: str):
+    if settings.AI_ANSWER_CACHE_ENABLED:
+        _answer_cache.set(key, answer, settings.AI_ANSWER_CACHE_TTL_SECONDS)
+        with _stats_lock:
+            _stats["stores"] += 1
+
+
+async def cache_answer_async(key: str, answer: str):
+    if not _answer_cache.blocking:
+        cache_answer(key, answer)
+        return
+    await run_in_threadpool(cache_answer, key, answer)
+
+
+def answer_cache_metrics() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+        "backend": type(_answer_cache).__name__,
+        "enabled": settings.AI_ANSWER_CACHE_ENABLED,
+    }
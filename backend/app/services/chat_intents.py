@@ -0,0 +1,280 @@
+"""
+Deterministic answers for aggregate chat questions.
+
+Questions like "how much did I spend on rent last month?" or "what was my
+biggest expense this year?" are recognised with a few regular expressions and
+answered from indexed SQL aggregates, so they get exact figures in
+milliseconds. Anything that looks like a request for advice, that the parser
+does not understand, or that names something no transaction matches returns
+None and goes to the LLM as before.
+"""
+
+import calendar
+import re
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.expense import TransactionType
+from app.models.user import get_user_details
+from app.services.stats_service import (
+    get_largest_expense, get_lifetime_totals, get_month_range, get_range_totals, get_top_details, last_n_months
+)
+
+
+class Period(NamedTuple):
+    start: Optional[datetime]
+    end: Optional[datetime]
+    label: str  # Reads after a verb: "You spent 10.00 INR <label>"
+
+
+class Intent(NamedTuple):
+    kind: str  # spend, income, net, largest, largest_income, top, count, expense_count
+    period: Period
+    keywords: Tuple[str, ...]  # Details to match, any of them
+
+
+ALL_TIME = Period(None, None, "overall")
+
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+_MONTH_NAMES = "|".join(name for name in _MONTHS if name != "may")
+
+_ADVICE = re.compile(
+    r"\b(should|could|advi[cs]e|tips?|suggest\w*|recommend\w*|improve|why|plan|budget\w*|"
+    r"help|ideas?|reduce|cut|afford|better|worse|invest\w*|how (can|do|to))\b"
+)
+_QUESTION = re.compile(r"\b(how much|how many|what|total|show|tell|list|which|where|vs|versus|compared?)\b")
+_LARGEST = re.compile(r"\b(biggest|largest|highest|most expensive|max(imum)?)\b")
+_INCOME_WORD = r"(income|earn\w*|receiv\w*|credit\w*|salary|deposit\w*)"
+_SPEND_WORD = r"(spen[dt]\w*|expenses?|expenditure|paid|pay\w*|purchases?|debit\w*|cost)"
+_INCOME = re.compile(rf"\b{_INCOME_WORD}\b")
+_SPEND = re.compile(rf"\b{_SPEND_WORD}\b")
+_NET = re.compile(r"\b(net|sav(e|ed|ings?)|balance|left over)\b")
+_TOP = re.compile(r"\b(top|most)\b")
+_COUNT = re.compile(r"\bhow many\b")
+_COUNT_NOUN = re.compile(r"\b(transactions?|expenses?|payments?|purchases?|entries)\b")
+_EXPENSE_NOUN = re.compile(r"\b(expenses?|payments?|purchases?)\b")
+# Filters on amounts ("expenses above 2000") are not aggregates the parser answers
+_COMPARISON = re.compile(
+    r"\b(more|less|fewer|greater|bigger|larger|smaller|higher|lower) than\b|\bexceed\w*|"
+    r"\b(above|over|under|below|at least|at most)\s+(rs\.?|inr|usd|eur)?\s*[$\u20b9\u20ac\u00a3]?\s*\d"
+)
+_KEYWORD = re.compile(r"\b(?:on|for|at|to|from)\s+(?:my\s+|the\s+|a\s+)?([a-z0-9][a-z0-9 &',./-]*)")
+# Left behind at the end once the period phrase is cut out ("coffee in the [last 30 days]")
+_KEYWORD_FILLER = re.compile(
+    r"(\s+\b(so far|till now|until now|to date|in total|overall|altogether|total|in the|in|during|over|for|since|of))+$"
+)
+_KEYWORD_SEPARATOR = re.compile(r"\s*,\s*|\s+(?:and|or|&)\s+")
+_KEYWORD_IGNORED = {"me", "it", "them", "everything", "all", "things", "stuff", "total", "date", "now"}
+# Period phrases parse_period does not understand ("since january", "in q1",
+# "last 2 weeks"); what is left of them would silently widen the period
+_UNPARSED_PERIOD = re.compile(
+    r"\b(since|after|before|between|ago|q[1-4]|quarters?|halfs?|half-year|weekends?|fortnights?|"
+    r"days|weeks|months|years|morning|evening|night|tonight)\b"
+)
+# Words that carry no content of their own once the intent words are removed
+_FILLER_WORDS = {
+    "a", "all", "altogether", "am", "amount", "an", "and", "any", "are", "at", "been", "by", "date", "did", "do",
+    "does", "ever", "far", "for", "from", "get", "give", "got", "had", "has", "have", "i", "in", "is", "it", "ive",
+    "made", "make", "me", "money", "my", "now", "of", "on", "overall", "s", "so", "sum", "that", "the", "there",
+    "this", "till", "time", "to", "until", "up", "was", "were", "whats", "with",
+}
+_INTENT_WORDS = (_QUESTION, _LARGEST, _INCOME, _SPEND, _NET, _TOP, _COUNT, _COUNT_NOUN)
+
+
+def _months_period(months, label: str) -> Period:
+    return Period(get_month_range(*months[0])[0], get_month_range(*months[-1])[1], label)
+
+
+def _month_label(year: int, month: int) -> str:
+    return f"in {calendar.month_name[month]} {year}"
+
+
+def parse_period(text: str, now: Optional[datetime] = None):
+    """The period a question refers to and the text with that phrase removed"""
+    now = now or datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    this_month = (now.year, now.month)
+    previous_month = last_n_months(2, now)[0]
+
+    patterns = [
+        (r"\b(this|current) month\b", lambda m: _months_period([this_month], _month_label(*this_month))),
+        (r"\b(last|previous) month\b", lambda m: _months_period([previous_month], _month_label(*previous_month))),
+        (r"\b(?:last|past|previous) (\d{1,2}) months\b", lambda m: _months_period(
+            last_n_months(int(m.group(1)), now), f"in the last {int(m.group(1))} months"
+        )),
+        (r"\b(?:last|past|previous) (\d{1,3}) days\b", lambda m: Period(
+            today - timedelta(days=int(m.group(1)) - 1), today + timedelta(days=1),
+            f"in the last {int(m.group(1))} days"
+        )),
+        (r"\btoday\b", lambda m: Period(today, today + timedelta(days=1), "today")),
+        (r"\byesterday\b", lambda m: Period(today - timedelta(days=1), today, "yesterday")),
+        (r"\b(this|current) week\b", lambda m: Period(
+            today - timedelta(days=today.weekday()), today + timedelta(days=1), "this week"
+        )),
+        (r"\b(last|previous) week\b", lambda m: Period(
+            today - timedelta(days=today.weekday() + 7), today - timedelta(days=today.weekday()), "last week"
+        )),
+        (r"\b(this|current) year\b", lambda m: Period(datetime(now.year, 1, 1), datetime(now.year + 1, 1, 1), f"in {now.year}")),
+        (r"\b(last|previous) year\b", lambda m: Period(
+            datetime(now.year - 1, 1, 1), datetime(now.year, 1, 1), f"in {now.year - 1}"
+        )),
+        # "may" is only a month after a preposition ("in may"), never "may I"
+        (rf"\b(?:(?:in|for|during|of)\s+(may)|({_MONTH_NAMES}))(?:\s+(\d{{4}}))?\b", None),
+        # A bare number is only a year after a preposition: "expenses above 2000" is an amount
+        (r"\b(?:in|for|during|of)\s+(20\d\d)\b", lambda m: Period(
+            datetime(int(m.group(1)), 1, 1), datetime(int(m.group(1)) + 1, 1, 1), f"in {m.group(1)}"
+        )),
+    ]
+    for pattern, build in patterns:
+        match = re.search(pattern, text)
+        if match is None:
+            continue
+        if build is None:
+            month = _MONTHS[match.group(1) or match.group(2)]
+            if match.group(3):
+                year = int(match.group(3))
+            else:
+                # Without a year, the latest such month that has started
+                year = now.year if month <= now.month else now.year - 1
+            period = _months_period([(year, month)], _month_label(year, month))
+        else:
+            period = build(match)
+        return period, (text[:match.start()] + " " + text[match.end():]).strip()
+    return ALL_TIME, text
+
+
+def _keywords(text: str) -> Tuple[str, ...]:
+    """The details a question is about; "food and groceries" means either"""
+    match = _KEYWORD.search(text)
+    if match is None:
+        return ()
+    phrase = _KEYWORD_FILLER.sub("", match.group(1).strip(" ,.'-")).strip()
+    keywords = []
+    for keyword in _KEYWORD_SEPARATOR.split(phrase):
+        keyword = keyword.strip(" .'-")
+        if keyword and keyword not in _KEYWORD_IGNORED and keyword not in keywords:
+            keywords.append(keyword)
+    return tuple(keywords)
+
+
+def _uses_every_word(rest: str, with_keywords: bool) -> bool:
+    """Whether the parsed intent accounts for the whole question: anything left
+    over ("the cost of my car insurance") changes what is being asked"""
+    if _UNPARSED_PERIOD.search(rest):
+        return False
+    if with_keywords:
+        rest = _KEYWORD.sub(" ", rest, count=1)
+    for pattern in _INTENT_WORDS:
+        rest = pattern.sub(" ", rest)
+    return all(word in _FILLER_WORDS for word in re.findall(r"[a-z0-9]+", rest))
+
+
+def _complete(intent: Intent, rest: str) -> Optional[Intent]:
+    with_keywords = intent.kind in ("spend", "income", "count", "expense_count")
+    return intent if _uses_every_word(rest, with_keywords) else None
+
+
+def parse_intent(message: str, now: Optional[datetime] = None) -> Optional[Intent]:
+    """Recognise an aggregate question, or None when the LLM should answer it"""
+    text = " ".join(message.lower().replace("?", " ").split())
+    if _ADVICE.search(text) or _COMPARISON.search(text):
+        return None
+    if not any(p.search(text) for p in (_QUESTION, _LARGEST, _TOP)):
+        return None
+    period, rest = parse_period(text, now)
+
+    if _LARGEST.search(rest):
+        if _INCOME.search(rest):
+            return _complete(Intent("largest_income", period, ()), rest)
+        if _SPEND.search(rest) or re.search(r"\btransactions?\b", rest):
+            return _complete(Intent("largest", period, ()), rest)
+        return None
+    if _TOP.search(rest) and _SPEND.search(rest) and not _COUNT.search(rest):
+        return _complete(Intent("top", period, ()), rest)
+    if _COUNT.search(rest) and _COUNT_NOUN.search(rest):
+        # "How many payments did I receive" counts income, not expenses
+        kind = "expense_count" if _EXPENSE_NOUN.search(rest) and not _INCOME.search(rest) else "count"
+        return _complete(Intent(kind, period, _keywords(rest)), rest)
+    if _NET.search(rest) or (_INCOME.search(rest) and _SPEND.search(rest)):
+        return _complete(Intent("net", period, ()), rest)
+    if _SPEND.search(rest):
+        return _complete(Intent("spend", period, _keywords(rest)), rest)
+    if _INCOME.search(rest):
+        return _complete(Intent("income", period, _keywords(rest)), rest)
+    return None
+
+
+def _money(amount: float, currency: str) -> str:
+    return f"{amount:,.2f} {currency}"
+
+
+def _transactions(count: int) -> str:
+    return f"{count} transaction{'' if count == 1 else 's'}"
+
+
+def _expenses(count: int) -> str:
+    return f"{count} expense{'' if count == 1 else 's'}"
+
+
+def answer_intent(intent: Intent, user_id: int, db: Session) -> Optional[str]:
+    """Exact answer to a parsed question, straight from SQL, or None when the
+    details it names match no transactions and the LLM should interpret it"""
+    user = get_user_details(user_id, db)
+    currency = user.currency or "INR"
+    period = intent.period
+    preposition = {"income": "from", "count": "for", "expense_count": "for"}.get(intent.kind, "on")
+    matching = f" {preposition} {' and '.join(intent.keywords)}" if intent.keywords else ""
+
+    if intent.kind in ("largest", "largest_income"):
+        transaction_type = TransactionType.CREDIT if intent.kind == "largest_income" else TransactionType.DEBIT
+        noun = "income" if intent.kind == "largest_income" else "expense"
+        expense = get_largest_expense(db, user_id, period.start, period.end, transaction_type)
+        if expense is None:
+            return f"No {noun} found in your records {period.label}."
+        details = " ".join((expense.details or "No details").split())
+        return (
+            f"Your largest {noun} {period.label} was {_money(expense.amount, currency)} "
+            f"for {details} on {expense.transaction_date.strftime('%Y-%m-%d')}."
+        )
+
+    if intent.kind == "top":
+        top = get_top_details(db, user_id, period.start, limit=5, until=period.end)
+        if not top:
+            return f"No expenses found in your records {period.label}."
+        lines = [
+            f"{rank}. {' '.join((details or 'No details').split())}: {_money(amount, currency)} ({_transactions(count)})"
+            for rank, (details, amount, count) in enumerate(top, start=1)
+        ]
+        return f"Your top spending {period.label}:\n" + "\n".join(lines)
+
+    if period is ALL_TIME and not intent.keywords:
+        totals = get_lifetime_totals(db, user_id)
+    else:
+        totals = get_range_totals(db, user_id, period.start, period.end, intent.keywords)
+    if intent.keywords and totals["count"] == 0:
+        # Perhaps worded differently from the details ("food" vs "Swiggy")
+        return None
+
+    if intent.kind == "count":
+        return f"You have {_transactions(totals['count'])}{matching} {period.label}."
+    if intent.kind == "expense_count":
+        return f"You have {_expenses(totals['debit_count'])}{matching} {period.label}."
+    if intent.kind == "net":
+        outcome = (
+            f"you saved {_money(totals['net'], currency)}" if totals["net"] >= 0
+            else f"you spent {_money(-totals['net'], currency)} more than you earned"
+        )
+        return (
+            f"Your income {period.label} was {_money(totals['credit'], currency)} and your expenses were "
+            f"{_money(totals['debit'], currency)}, so {outcome}."
+        )
+
+    key = "credit" if intent.kind == "income" else "debit"
+    count = totals[f"{key}_count"]
+    if count == 0:
+        noun = "income" if key == "credit" else "expenses"
+        return f"No {noun}{matching} found in your records {period.label}."
+    suffix = f" ({_transactions(count)})"
+    if key == "credit":
+        return f"Your income{matching} {period.label} was {_money(totals['credit'], currency)}{suffix}."
+    return f"You spent {_money(totals['debit'], currency)}{matching} {period.label}{suffix}."
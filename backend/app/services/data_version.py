@@ -0,0 +1,50 @@
+from typing import Iterable
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.models.data_version import UserDataVersion
+
+
+def _upsert_statement(db: Session, rows: list):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    table = UserDataVersion.__table__
+    stmt = insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={"version": table.c.version + 1, "updated_at": func.now()},
+    )
+
+
+def bump_data_versions(db: Session, user_ids: Iterable[int]):
+    """Advance the data version of each user inside the caller's transaction"""
+    # Sorted so concurrent batches lock version rows in the same order
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+
+    stmt = _upsert_statement(db, [{"user_id": user_id, "version": 1} for user_id in user_ids])
+    if stmt is not None:
+        db.execute(stmt)
+        return
+
+    for user_id in user_ids:
+        row = db.query(UserDataVersion).filter_by(user_id=user_id).with_for_update().first()
+        if row is None:
+            db.add(UserDataVersion(user_id=user_id, version=1))
+        else:
+            row.version += 1
+    db.flush()
+
+
+def get_data_version(db: Session, user_id: int) -> int:
+    """Current data version of a user's expenses (0 before the first write)"""
+    version = db.execute(
+        select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)
+    ).scalar()
+    return version or 0
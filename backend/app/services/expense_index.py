@@ -0,0 +1,196 @@
+"""
+Per-user retrieval index over expense details.
+
+An in-process inverted index (term -> expense ids) scored with BM25 finds the
+transactions relevant to a chat question, so "what did I pay for insurance
+last year?" sees the insurance payments even when they are far older than the
+recent rows listed in the prompt.
+
+Each index remembers the user's data version. After an expense write only the
+rows created or updated since the last sync are read and tokenised again.
+Deleted rows are dropped lazily, when a search no longer finds them in the
+database, and every index is rebuilt after EXPENSE_INDEX_REBUILD_SECONDS as a
+backstop. Indexes are kept for the EXPENSE_INDEX_MAX_USERS most recent users.
+"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.expense import Expense
+from app.services.data_version import get_data_version
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Words of a question that say nothing about which transactions it means
+_QUERY_STOPWORDS = {
+    "a", "all", "am", "an", "and", "any", "are", "at", "be", "bought", "buy", "by", "can", "did", "do", "does",
+    "expense", "expenses", "for", "from", "get", "got", "had", "has", "have", "how", "i", "in", "is", "it",
+    "last", "list", "many", "me", "month", "much", "my", "of", "on", "paid", "pay", "payment", "show", "spend",
+    "spending", "spent", "tell", "that", "the", "this", "to", "total", "transaction", "was", "were", "what",
+    "when", "where", "which", "who", "why", "will", "with", "year", "you", "your",
+}
+# Writes in transactions that started before the last sync carry older
+# timestamps, so each sync re-reads this much history again
+_SYNC_OVERLAP = timedelta(minutes=5)
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+def _stem(token: str) -> str:
+    # Plural "payments" and singular "payment" should match each other
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [_stem(token) for token in _TOKEN.findall((text or "").lower()) if len(token) > 1 or token.isdigit()]
+
+
+def query_terms(question: str) -> List[str]:
+    return [term for term in tokenize(question) if term not in _QUERY_STOPWORDS and not term.isdigit()]
+
+
+class ExpenseIndex:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.version: Optional[int] = None
+        self.synced_through: Optional[datetime] = None  # Latest created/updated timestamp read
+        self.built_at = 0.0
+        self._postings: Dict[str, Set[int]] = {}
+        # expense id -> (terms, transaction timestamp used to prefer recent matches)
+        self._docs: Dict[int, Tuple[Tuple[str, ...], float]] = {}
+        self._total_terms = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, expense_id: int, details: Optional[str], transaction_date: Optional[datetime]):
+        self.remove(expense_id)
+        terms = tuple(tokenize(details))
+        self._docs[expense_id] = (terms, transaction_date.timestamp() if transaction_date else 0.0)
+        self._total_terms += len(terms)
+        for term in set(terms):
+            self._postings.setdefault(term, set()).add(expense_id)
+
+    def remove(self, expense_id: int):
+        doc = self._docs.pop(expense_id, None)
+        if doc is None:
+            return
+        self._total_terms -= len(doc[0])
+        for term in set(doc[0]):
+            ids = self._postings.get(term)
+            if ids is not None:
+                ids.discard(expense_id)
+                if not ids:
+                    del self._postings[term]
+
+    def clear(self):
+        self._postings.clear()
+        self._docs.clear()
+        self._total_terms = 0
+
+    def search(self, terms: List[str], limit: int) -> List[int]:
+        """Expense ids ranked by BM25 over their details, most recent first among equals"""
+        if not self._docs:
+            return []
+        count = len(self._docs)
+        average_length = self._total_terms / count or 1.0
+        scores: Dict[int, float] = Counter()
+        for term in set(terms):
+            ids = self._postings.get(term)
+            if not ids:
+                continue
+            idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            for expense_id in ids:
+                doc_terms = self._docs[expense_id][0]
+                frequency = doc_terms.count(term)
+                norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * len(doc_terms) / average_length)
+                scores[expense_id] += idf * frequency * (_BM25_K1 + 1) / (frequency + norm)
+        ranked = sorted(scores, key=lambda expense_id: (scores[expense_id], self._docs[expense_id][1]), reverse=True)
+        return ranked[:limit]
+
+
+_indexes: "OrderedDict[int, ExpenseIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _get_index(user_id: int) -> ExpenseIndex:
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = ExpenseIndex(user_id)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > settings.EXPENSE_INDEX_MAX_USERS:
+            _indexes.popitem(last=False)
+        return index
+
+
+def _sync(index: ExpenseIndex, db: Session):
+    """Bring an index up to date with the user's expenses; the caller holds index.lock"""
+    # Read before the rows: a write committed in between bumps the version
+    # again, so it is picked up by the next sync
+    version = get_data_version(db, index.user_id)
+    rebuild = index.version is None or time.monotonic() - index.built_at > settings.EXPENSE_INDEX_REBUILD_SECONDS
+    if not rebuild and version == index.version:
+        return
+
+    changed = func.coalesce(Expense.updated_at, Expense.created_at)
+    query = select(Expense.id, Expense.details, Expense.transaction_date, changed).where(
+        Expense.user_id == index.user_id
+    )
+    if rebuild:
+        index.clear()
+        index.built_at = time.monotonic()
+    elif index.synced_through is not None:
+        since = index.synced_through - _SYNC_OVERLAP
+        query = query.where(or_(Expense.created_at >= since, Expense.updated_at >= since))
+
+    for expense_id, details, transaction_date, changed_at in db.execute(query):
+        index.add(expense_id, details, transaction_date)
+        if changed_at is not None and (index.synced_through is None or changed_at > index.synced_through):
+            index.synced_through = changed_at
+    index.version = version
+
+
+def search_expenses(db: Session, user_id: int, question: str, limit: int) -> List[Expense]:
+    """Up to `limit` of the user's expenses whose details best match the question"""
+    terms = query_terms(question)
+    if not terms or limit <= 0:
+        return []
+
+    index = _get_index(user_id)
+    with index.lock:
+        _sync(index, db)
+        # Over-fetch so rows deleted since the last rebuild do not shrink the result
+        candidates = index.search(terms, limit * 2)
+    if not candidates:
+        return []
+
+    rows = {
+        expense.id: expense
+        for expense in db.query(Expense).filter(Expense.user_id == user_id, Expense.id.in_(candidates))
+    }
+    missing = [expense_id for expense_id in candidates if expense_id not in rows]
+    if missing:
+        with index.lock:
+            for expense_id in missing:
+                index.remove(expense_id)
+    return [rows[expense_id] for expense_id in candidates if expense_id in rows][:limit]
+
+
+def expense_index_metrics() -> dict:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    return {
+        "users": len(indexes),
+        "max_users": settings.EXPENSE_INDEX_MAX_USERS,
+        "indexed_expenses": sum(len(index) for index in indexes),
+    }
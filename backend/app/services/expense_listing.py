@@ -0,0 +1,95 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import func, literal, tuple_
+from sqlalchemy.orm import Session
+from app.models.expense import Expense, TransactionType
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def expense_filters(
+    user_id: int,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    transaction_type: Optional[TransactionType] = None
+) -> list:
+    """Index-friendly WHERE criteria; `to_date` is inclusive"""
+    criteria = [Expense.user_id == user_id]
+    if from_date is not None:
+        criteria.append(Expense.transaction_date >= datetime.combine(from_date, datetime.min.time()))
+    if to_date is not None:
+        criteria.append(Expense.transaction_date < datetime.combine(to_date + timedelta(days=1), datetime.min.time()))
+    if transaction_type is not None:
+        criteria.append(Expense.transaction_type == transaction_type)
+    return criteria
+
+
+def _sort_key(db: Session):
+    """(transaction_date, created_at, id) as compared by the database"""
+    created_at = Expense.created_at
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite keeps server-default timestamps as text without microseconds,
+        # so compare a normalised form that sorts the same way on both sides
+        created_at = func.datetime(Expense.created_at)
+    return Expense.transaction_date, created_at, Expense.id
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(key: Tuple) -> str:
+    payload = json.dumps([_encode_value(v) for v in key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != 3:
+            raise InvalidCursor("Malformed cursor")
+        return tuple(_decode_value(v) for v in values)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+
+def fetch_expense_page(
+    db: Session,
+    criteria: list,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Expense], Optional[str]]:
+    """One page of expenses, newest first, plus the cursor for the next page"""
+    date_key, created_key, id_key = _sort_key(db)
+    query = db.query(Expense, created_key).filter(*criteria)
+    if cursor:
+        after = [
+            literal(value, column.type)
+            for value, column in zip(decode_cursor(cursor), (date_key, created_key, id_key))
+        ]
+        query = query.filter(tuple_(date_key, created_key, id_key) < tuple_(*after))
+
+    rows = query.order_by(
+        date_key.desc(), created_key.desc(), id_key.desc()
+    ).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, last_created = rows[-1]
+        next_cursor = encode_cursor((last.transaction_date, last_created, last.id))
+    return [expense for expense, _ in rows], next_cursor
@@ -0,0 +1,199 @@
+"""
+Group commit for expense creation: concurrent inserts that arrive within a
+few milliseconds are written in one transaction with INSERT ... RETURNING,
+and every caller still receives its own row or its own error.
+"""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple, Union
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.expense import Expense
+from app.services.rollup_service import collect_rollup_deltas, apply_rollup_deltas
+
+logger = logging.getLogger(__name__)
+
+# (insert values, caller's future, enqueue time)
+_Pending = Tuple[dict, asyncio.Future, float]
+
+
+async def find_idempotent_expenses(db: AsyncSession, keys: List[Tuple[int, str]]) -> dict:
+    """Existing expenses for the given (user_id, idempotency_key) pairs"""
+    if not keys:
+        return {}
+    result = await db.execute(select(Expense).where(or_(*[
+        and_(Expense.user_id == user_id, Expense.idempotency_key == key)
+        for user_id, key in keys
+    ])))
+    return {(e.user_id, e.idempotency_key): e for e in result.scalars().all()}
+
+
+async def insert_expenses(db: AsyncSession, rows: List[dict]) -> List[Expense]:
+    """Insert rows in one statement, returning the stored expenses in input order,
+    reusing existing rows for repeated idempotency keys. The caller commits."""
+    keyed = {(r["user_id"], r["idempotency_key"]) for r in rows if r.get("idempotency_key")}
+    existing = await find_idempotent_expenses(db, list(keyed))
+
+    results: List[Optional[Expense]] = [None] * len(rows)
+    first_index = {}
+    to_insert = []
+    for index, row in enumerate(rows):
+        key = (row["user_id"], row.get("idempotency_key"))
+        if key[1] and key in existing:
+            results[index] = existing[key]
+        elif key[1] and key in first_index:
+            continue
+        else:
+            if key[1]:
+                first_index[key] = index
+            to_insert.append(index)
+
+    if to_insert:
+        inserted = (await db.scalars(
+            insert(Expense).returning(Expense, sort_by_parameter_order=True),
+            [rows[i] for i in to_insert]
+        )).all()
+        for index, expense in zip(to_insert, inserted):
+            results[index] = expense
+        deltas = await db.run_sync(
+            collect_rollup_deltas, Expense.id.in_([e.id for e in inserted])
+        )
+        await db.run_sync(apply_rollup_deltas, added=deltas)
+
+    # Duplicate keys inside the same batch resolve to the row inserted first
+    for index, row in enumerate(rows):
+        if results[index] is None:
+            results[index] = results[first_index[(row["user_id"], row["idempotency_key"])]]
+    return results
+
+
+class ExpenseGroupCommitter:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.rows = 0
+        self.max_batch_size = 0
+        self.fallbacks = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, row: dict) -> Expense:
+        """Queue one insert and wait for the batch that carries it to commit"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future, time.monotonic()))
+        return await future
+
+    async def _collect(self) -> List[_Pending]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.GROUP_COMMIT_MAX_WAIT_MS / 1000
+        while len(batch) < settings.GROUP_COMMIT_MAX_BATCH:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Server is shutting down"))
+                raise
+            except Exception as e:
+                logger.exception("Group commit flush failed")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _flush(self, batch: List[_Pending]):
+        outcomes: List[Union[Expense, Exception]]
+        try:
+            async with AsyncSessionLocal() as db:
+                outcomes = await insert_expenses(db, [row for row, _, _ in batch])
+                await db.commit()
+        except Exception as e:
+            # One bad row must not fail its neighbours: retry each row on its own
+            logger.warning(f"Group commit of {len(batch)} rows failed ({e}); retrying individually")
+            self.fallbacks += 1
+            outcomes = [await self._insert_single(row) for row, _, _ in batch]
+
+        now = time.monotonic()
+        self.batches += 1
+        self.rows += len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        for (_, future, queued_at), outcome in zip(batch, outcomes):
+            waited = now - queued_at
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if future.done():
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    async def _insert_single(self, row: dict) -> Union[Expense, Exception]:
+        # A second attempt picks up a row a concurrent request inserted under the same key
+        for attempt in range(2):
+            try:
+                async with AsyncSessionLocal() as db:
+                    expense = (await insert_expenses(db, [row]))[0]
+                    await db.commit()
+                    return expense
+            except IntegrityError as e:
+                if attempt or not row.get("idempotency_key"):
+                    return e
+            except Exception as e:
+                return e
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": settings.EXPENSE_GROUP_COMMIT,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "avg_wait_ms": round(self.total_wait_seconds * 1000 / self.rows, 3) if self.rows else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+            "fallbacks": self.fallbacks,
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Server is shutting down"))
+
+
+expense_committer = ExpenseGroupCommitter()
@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+from typing import IO, Iterator, Optional, Tuple
+
+SUPPORTED_FORMATS = ("csv", "jsonl")
+
+# Column names accepted in uploads, including the headers our own exports use
+HEADER_ALIASES = {
+    "details": "details",
+    "description": "details",
+    "amount": "amount",
+    "transaction_type": "transaction_type",
+    "type": "transaction_type",
+    "transaction_date": "transaction_date",
+    "date": "transaction_date",
+}
+
+# (1-based data row number, normalised record or None, parse error or None)
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str], requested: Optional[str] = None) -> str:
+    """Pick csv or jsonl from an explicit choice, the file extension or the content type"""
+    if requested:
+        fmt = requested.lower()
+        if fmt in ("ndjson", "jsonlines"):
+            fmt = "jsonl"
+        if fmt not in SUPPORTED_FORMATS:
+            raise ImportFormatError(f"Unsupported import format: {requested}")
+        return fmt
+
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "json" in content_type:
+        return "jsonl"
+    raise ImportFormatError("Could not detect the upload format; pass format=csv or format=jsonl")
+
+
+def normalise_record(record: dict) -> dict:
+    """Map aliased column names and tidy values before schema validation"""
+    normalised = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        field = HEADER_ALIASES.get(str(key).strip().lower())
+        if field is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if field == "transaction_type":
+                value = value.lower()
+            elif field == "amount":
+                value = value.replace(",", "")
+        normalised[field] = value
+    return normalised
+
+
+def _iter_csv(text: IO[str]) -> Iterator[ParsedRow]:
+    reader = csv.DictReader(text)
+    row_number = 0
+    while True:
+        row_number += 1
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # Oversized or malformed field; the reader has consumed the line and
+            # resumes at the next one
+            yield row_number, None, f"Invalid CSV: {e}"
+            continue
+        if not any((v or "").strip() for v in record.values() if isinstance(v, str)):
+            continue
+        yield row_number, normalise_record(record), None
+
+
+def _iter_jsonl(text: IO[str]) -> Iterator[ParsedRow]:
+    for row_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, None, f"Invalid JSON: {e.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, "Each line must be a JSON object"
+            continue
+        yield row_number, normalise_record(record), None
+
+
+def iter_upload_rows(fileobj: IO[bytes], fmt: str) -> Iterator[ParsedRow]:
+    """Lazily parse an uploaded file one record at a time"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        if fmt == "csv":
+            yield from _iter_csv(text)
+        else:
+            yield from _iter_jsonl(text)
+    finally:
+        # Leave the underlying upload open for its owner to close
+        text.detach()
@@ -1,107 +1,466 @@
+import asyncio
 import httpx
+import json
+import logging
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401 - lets httpx negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class LLMStreamError(Exception):
+    pass
+
+
+# Failure messages returned by generate_response instead of a model answer
+PROVIDER_ERROR_RESPONSES = frozenset({
+    "AI service temporarily unavailable.",
+    "Connection issues. Please try again.",
+    "OpenAI service unavailable.",
+    "Gemini service unavailable.",
+    "No response generated.",
+})
+
+
+async def _sse_data(response: httpx.Response) -> AsyncIterator[dict]:
+    """JSON payloads of a server-sent event stream, until [DONE]"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        if data:
+            yield json.loads(data)
+
+
+async def _check_stream_status(response: httpx.Response, name: str):
+    if response.status_code != 200:
+        body = (await response.aread()).decode(errors="replace")
+        logger.warning(f"{name} stream error: {response.status_code} - {body[:200]}")
+        raise LLMStreamError(f"{name} service unavailable.")
+
+
+def _client_options(timeout: float, max_connections: int, max_keepalive: int, http2: bool = False) -> dict:
+    return {
+        "timeout": httpx.Timeout(timeout, connect=settings.LLM_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        "http2": http2 and settings.LLM_HTTP2 and HTTP2_AVAILABLE,
+    }
+
 class LLMProvider(ABC):
+    """Long-lived provider owning one pooled HTTP client, so connections and
+    TLS sessions are reused across chat messages"""
+
+    name: str
+    model: str
+
+    @property
+    @abstractmethod
+    def context_tokens(self) -> int:
+        pass
+
+    @property
+    @abstractmethod
+    def reply_tokens(self) -> int:
+        pass
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @abstractmethod
+    def client_options(self) -> dict:
+        pass
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(**self.client_options())
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def warm_up(self) -> bool:
+        """Make sure the model is ready to answer; hosted APIs always are"""
+        return True
+
+    def metrics(self) -> dict:
+        return {"provider": self.name, "model": self.model}
+
     @abstractmethod
     async def generate_response(self, prompt: str) -> str:
         pass
 
+    @abstractmethod
+    def stream_response(self, prompt: str) -> AsyncIterator[str]:
+        """Yield text fragments as the model produces them. Closing the
+        iterator early closes the upstream connection, which stops generation."""
+        pass
+
 class OllamaProvider(LLMProvider):
+    """Local Ollama server. Requests ask Ollama to keep the model loaded for
+    OLLAMA_KEEP_ALIVE, and the load/prompt/generation timings Ollama reports
+    are kept for /health/llm."""
+
+    name = "ollama"
+    # A load_duration above this means the model had been unloaded
+    COLD_LOAD_SECONDS = 1.0
+
+    def __init__(self):
+        super().__init__()
+        self.last_used = 0.0
+        self._timings = {
+            "requests": 0,
+            "warm_ups": 0,
+            "cold_loads": 0,
+            "last_cold_load_at": None,
+            "load_seconds_total": 0.0,
+            "last_load_seconds": None,
+            "last_prompt_eval_seconds": None,
+            "last_prompt_tokens": None,
+            "last_eval_seconds": None,
+            "last_eval_tokens_per_second": None,
+            "last_total_seconds": None,
+        }
+
+    @property
+    def model(self) -> str:
+        return settings.OLLAMA_MODEL
+
+    @property
+    def context_tokens(self) -> int:
+        return settings.OLLAMA_NUM_CTX
+
+    @property
+    def reply_tokens(self) -> int:
+        return settings.OLLAMA_NUM_PREDICT
+
+    def client_options(self) -> dict:
+        # Ollama serves plain HTTP/1.1
+        return _client_options(
+            settings.OLLAMA_TIMEOUT, settings.OLLAMA_MAX_CONNECTIONS, settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS
+        )
+
+    def _options(self) -> dict:
+        # Warm-ups send the same num_ctx/num_thread: a different value makes Ollama reload the model
+        options = {"num_ctx": settings.OLLAMA_NUM_CTX}
+        if settings.OLLAMA_NUM_THREAD > 0:
+            options["num_thread"] = settings.OLLAMA_NUM_THREAD
+        return options
+
+    def _payload(self, prompt: str, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "options": {
+                **self._options(),
+                "temperature": 0.0,
+                "num_predict": settings.OLLAMA_NUM_PREDICT,
+                "repeat_penalty": 1.2,
+            }
+        }
+
+    def _record_timings(self, result: dict, warm_up: bool = False):
+        """Keep the durations (nanoseconds) Ollama reports with a finished request"""
+        self.last_used = time.monotonic()
+        timings = self._timings
+        timings["warm_ups" if warm_up else "requests"] += 1
+        if result.get("load_duration") is not None:
+            load = result["load_duration"] / 1e9
+            timings["last_load_seconds"] = round(load, 3)
+            timings["load_seconds_total"] = round(timings["load_seconds_total"] + load, 3)
+            if load >= self.COLD_LOAD_SECONDS:
+                timings["cold_loads"] += 1
+                timings["last_cold_load_at"] = datetime.now(timezone.utc).isoformat()
+                logger.info(f"Ollama loaded {self.model} in {load:.1f}s")
+        if warm_up:
+            return
+        if result.get("prompt_eval_duration") is not None:
+            timings["last_prompt_eval_seconds"] = round(result["prompt_eval_duration"] / 1e9, 3)
+            timings["last_prompt_tokens"] = result.get("prompt_eval_count")
+        if result.get("eval_duration"):
+            timings["last_eval_seconds"] = round(result["eval_duration"] / 1e9, 3)
+            timings["last_eval_tokens_per_second"] = round(
+                result.get("eval_count", 0) / (result["eval_duration"] / 1e9), 2
+            )
+        if result.get("total_duration") is not None:
+            timings["last_total_seconds"] = round(result["total_duration"] / 1e9, 3)
+
+    async def warm_up(self) -> bool:
+        """Load the model (an empty prompt only loads it) and restart its keep-alive timer"""
+        started = time.monotonic()
+        try:
+            response = await self.client.post(
+                f"{settings.OLLAMA_BASE_URL}/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": "",
+                    "stream": False,
+                    "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+                    "options": self._options(),
+                },
+                timeout=httpx.Timeout(settings.OLLAMA_WARMUP_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+            )
+        except httpx.HTTPError as e:
+            logger.warning(f"Ollama warm-up failed: {e!r}")
+            return False
+        if response.status_code != 200:
+            logger.warning(f"Ollama warm-up failed: {response.status_code} - {response.text[:200]}")
+            return False
+        result = response.json()
+        # A load-only reply may omit load_duration; its wall time is the load
+        result.setdefault("load_duration", (time.monotonic() - started) * 1e9)
+        self._record_timings(result, warm_up=True)
+        return True
+
+    def metrics(self) -> dict:
+        return {
+            **super().metrics(),
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "num_ctx": settings.OLLAMA_NUM_CTX,
+            "num_thread": settings.OLLAMA_NUM_THREAD or None,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1) if self.last_used else None,
+            **self._timings,
+        }
+
     async def generate_response(self, prompt: str) -> str:
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(
-                    f"{settings.OLLAMA_BASE_URL}/api/generate",
-                    json={
-                        "model": "gemma3:1b",
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.0,
-                            "num_ctx": 8192,
-                            "num_predict": 600,
-                            "repeat_penalty": 1.2,
-                        }
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result.get("response", "").strip()
-                else:
-                    return "AI service temporarily unavailable."
+            response = await self.client.post(
+                f"{settings.OLLAMA_BASE_URL}/api/generate",
+                json=self._payload(prompt, stream=False)
+            )
+
+            if response.status_code == 200:
+                result = response.json()
+                self._record_timings(result)
+                return result.get("response", "").strip()
+            else:
+                return "AI service temporarily unavailable."
         except Exception as e:
             print(f"Ollama error: {e}")
             return "Connection issues. Please try again."
 
+    async def stream_response(self, prompt: str) -> AsyncIterator[str]:
+        # Ollama streams one JSON object per line
+        async with self.client.stream(
+            "POST", f"{settings.OLLAMA_BASE_URL}/api/generate", json=self._payload(prompt, stream=True)
+        ) as response:
+            await _check_stream_status(response, "Ollama")
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise LLMStreamError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    # The final chunk carries the timings
+                    self._record_timings(chunk)
+                    break
+
 class OpenAIProvider(LLMProvider):
+    name = "openai"
+    model = "gpt-3.5-turbo"
+
+    @property
+    def context_tokens(self) -> int:
+        return settings.OPENAI_CONTEXT_TOKENS
+
+    @property
+    def reply_tokens(self) -> int:
+        return settings.OPENAI_MAX_TOKENS
+
+    def client_options(self) -> dict:
+        return _client_options(
+            settings.OPENAI_TIMEOUT, settings.OPENAI_MAX_CONNECTIONS, settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            http2=True
+        )
+
+    URL = "https://api.openai.com/v1/chat/completions"
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, prompt: str, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": settings.OPENAI_MAX_TOKENS,
+            "temperature": 0.1,
+            "stream": stream
+        }
+
     async def generate_response(self, prompt: str) -> str:
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "gpt-3.5-turbo",
-                        "messages": [{"role": "user", "content": prompt}],
-                        "max_tokens": 500,
-                        "temperature": 0.1
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["choices"][0]["message"]["content"].strip()
-                else:
-                    return "OpenAI service unavailable."
+            response = await self.client.post(
+                self.URL, headers=self._headers(), json=self._payload(prompt, stream=False)
+            )
+
+            if response.status_code == 200:
+                result = response.json()
+                return result["choices"][0]["message"]["content"].strip()
+            else:
+                return "OpenAI service unavailable."
         except Exception as e:
             print(f"OpenAI error: {e}")
             return "Connection issues. Please try again."
 
+    async def stream_response(self, prompt: str) -> AsyncIterator[str]:
+        async with self.client.stream(
+            "POST", self.URL, headers=self._headers(), json=self._payload(prompt, stream=True)
+        ) as response:
+            await _check_stream_status(response, "OpenAI")
+            async for chunk in _sse_data(response):
+                for choice in chunk.get("choices", []):
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+
 class GeminiProvider(LLMProvider):
+    name = "gemini"
+    model = "gemini-2.5-flash-lite"
+
+    @property
+    def context_tokens(self) -> int:
+        return settings.GEMINI_CONTEXT_TOKENS
+
+    @property
+    def reply_tokens(self) -> int:
+        return settings.GEMINI_MAX_TOKENS
+
+    def client_options(self) -> dict:
+        return _client_options(
+            settings.GEMINI_TIMEOUT, settings.GEMINI_MAX_CONNECTIONS, settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+            http2=True
+        )
+
+    @property
+    def model_url(self) -> str:
+        return f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}"
+
+    def _payload(self, prompt: str) -> dict:
+        return {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "temperature": 0.1,
+                "maxOutputTokens": settings.GEMINI_MAX_TOKENS
+            }
+        }
+
     async def generate_response(self, prompt: str) -> str:
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-lite:generateContent?key={settings.GEMINI_API_KEY}",
-                    headers={"Content-Type": "application/json"},
-                    json={
-                        "contents": [{"parts": [{"text": prompt}]}],
-                        "generationConfig": {
-                            "temperature": 0.1,
-                            "maxOutputTokens": 500
-                        }
-                    }
-                )
-                
-                print(f"Gemini response status: {response.status_code}")
-                print(f"Gemini response: {response.text[:200]}")
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if "candidates" in result and len(result["candidates"]) > 0:
-                        return result["candidates"][0]["content"]["parts"][0]["text"].strip()
-                    else:
-                        print(f"No candidates in response: {result}")
-                        return "No response generated."
+            response = await self.client.post(
+                f"{self.model_url}:generateContent?key={settings.GEMINI_API_KEY}",
+                headers={"Content-Type": "application/json"},
+                json=self._payload(prompt)
+            )
+
+            print(f"Gemini response status: {response.status_code}")
+            print(f"Gemini response: {response.text[:200]}")
+
+            if response.status_code == 200:
+                result = response.json()
+                if "candidates" in result and len(result["candidates"]) > 0:
+                    return result["candidates"][0]["content"]["parts"][0]["text"].strip()
                 else:
-                    print(f"Gemini API error: {response.status_code} - {response.text}")
-                    return "Gemini service unavailable."
+                    print(f"No candidates in response: {result}")
+                    return "No response generated."
+            else:
+                print(f"Gemini API error: {response.status_code} - {response.text}")
+                return "Gemini service unavailable."
         except Exception as e:
             print(f"Gemini error: {e}")
             import traceback
             traceback.print_exc()
             return "Connection issues. Please try again."
 
+    async def stream_response(self, prompt: str) -> AsyncIterator[str]:
+        async with self.client.stream(
+            "POST",
+            f"{self.model_url}:streamGenerateContent?alt=sse&key={settings.GEMINI_API_KEY}",
+            headers={"Content-Type": "application/json"},
+            json=self._payload(prompt)
+        ) as response:
+            await _check_stream_status(response, "Gemini")
+            async for chunk in _sse_data(response):
+                for candidate in chunk.get("candidates", []):
+                    for part in (candidate.get("content") or {}).get("parts", []):
+                        if part.get("text"):
+                            yield part["text"]
+
+PROVIDER_CLASSES = {
+    "ollama": OllamaProvider,
+    "openai": OpenAIProvider,
+    "gemini": GeminiProvider,
+}
+
+_providers: Dict[str, LLMProvider] = {}
+
 def get_llm_provider() -> LLMProvider:
-    if settings.LLM_PROVIDER == "openai":
-        return OpenAIProvider()
-    elif settings.LLM_PROVIDER == "gemini":
-        return GeminiProvider()
-    else:
-        return OllamaProvider()
\ No newline at end of file
+    """The shared provider for the configured LLM_PROVIDER (Ollama by default)"""
+    name = settings.LLM_PROVIDER if settings.LLM_PROVIDER in PROVIDER_CLASSES else "ollama"
+    provider = _providers.get(name)
+    if provider is None:
+        provider = _providers[name] = PROVIDER_CLASSES[name]()
+    return provider
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def start_llm_providers():
+    """Create the configured provider at startup; its client pools connections from the first call"""
+    global _loop
+    _loop = asyncio.get_running_loop()
+    provider = get_llm_provider()
+    http2 = "on" if provider.client_options()["http2"] else "off"
+    logger.info(f"LLM provider {type(provider).__name__} ready (HTTP/2 {http2}, model {provider.model})")
+
+async def warm_up_llm_provider() -> bool:
+    """Load the configured model ahead of the first chat so no user pays for it"""
+    provider = get_llm_provider()
+    started = time.monotonic()
+    ready = await provider.warm_up()
+    if ready:
+        logger.info(f"LLM model {provider.model} warm after {time.monotonic() - started:.1f}s")
+    return ready
+
+def keep_llm_warm():
+    """Scheduler job (runs in a scheduler thread): ping the model on the API
+    event loop unless chats kept it loaded recently"""
+    provider = get_llm_provider()
+    if _loop is None or _loop.is_closed() or not isinstance(provider, OllamaProvider):
+        return
+    if time.monotonic() - provider.last_used < settings.OLLAMA_KEEP_WARM_MINUTES * 60 / 2:
+        return
+    future = asyncio.run_coroutine_threadsafe(warm_up_llm_provider(), _loop)
+    try:
+        future.result(timeout=settings.OLLAMA_WARMUP_TIMEOUT + settings.LLM_CONNECT_TIMEOUT)
+    except Exception as e:
+        future.cancel()
+        logger.warning(f"LLM keep-warm ping failed: {e!r}")
+
+async def close_llm_providers():
+    for provider in _providers.values():
+        await provider.aclose()
+    _providers.clear()
@@ -0,0 +1,233 @@
+"""
+Token-budgeted AI chat prompts with a stable per-user prefix.
+
+A prompt is split in two:
+
+- The context prefix: instructions, the user's totals, monthly figures, top
+  spending and as many recent transactions as fit. It depends only on the
+  user's data version, the provider and the date, so it is byte-identical for
+  every question until the data changes and is cached between requests.
+  Ollama reuses the KV cache of a prompt prefix it has already evaluated, and
+  OpenAI/Gemini bill and prefill cached prefixes far more cheaply, so only
+  the question part has to be prefilled again.
+- The question suffix: transactions matching the question and the question.
+
+Budgets come from the provider's context window and reply length, e.g.
+Ollama's num_ctx and num_predict, less a safety margin. Tokens are estimated
+conservatively: one per digit or punctuation mark, since small models split
+numbers into single digits.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from datetime import date, datetime
+from typing import List, NamedTuple, Tuple
+from sqlalchemy.orm import Session
+from app.core.cache import create_cache
+from app.core.config import settings
+from app.models.expense import Expense, TransactionType
+from app.models.user import get_user_details
+from app.services.expense_index import search_expenses
+from app.services.llm_providers import LLMProvider
+from app.services.stats_service import (
+    get_details_totals, get_lifetime_totals, get_month_range, get_period_totals, get_recent_expenses,
+    get_top_details, last_n_months
+)
+
+logger = logging.getLogger(__name__)
+
+_prefix_cache = create_cache("ai_prompt_prefixes", settings.AI_PROMPT_PREFIX_CACHE_MAX_ENTRIES)
+
+_TOKEN_PIECES = re.compile(r"\d|[^\W\d_]+|[^\w\s]")
+
+
+class PromptBudget(NamedTuple):
+    context: int  # The provider's context window
+    reply: int  # Reserved for the generated answer
+    prefix: int
+    question: int
+
+    @property
+    def prompt(self) -> int:
+        return self.prefix + self.question
+
+
+class ContextPrefix(NamedTuple):
+    text: str
+    tokens: int
+    listed_ids: List[int]  # Transactions already in the prefix
+
+
+def estimate_tokens(text: str) -> int:
+    tokens = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        # Long words are split into several sub-word tokens
+        tokens += 1 + len(piece) // 6
+    return tokens
+
+
+def prompt_budget(provider: LLMProvider) -> PromptBudget:
+    available = provider.context_tokens - provider.reply_tokens - settings.AI_PROMPT_SAFETY_TOKENS
+    question = min(settings.AI_PROMPT_QUESTION_TOKENS, available // 3)
+    return PromptBudget(provider.context_tokens, provider.reply_tokens, available - question, question)
+
+
+def _compact(provider: LLMProvider) -> bool:
+    # Online APIs get a short context: they are billed per token
+    return provider.name != "ollama"
+
+
+def _month_label(year: int, month: int) -> str:
+    return datetime(year, month, 1).strftime("%Y-%m")
+
+
+def _clean_details(details) -> str:
+    return " ".join((details or "No details").split()).replace("|", "/")
+
+
+def _toon_line(e: Expense) -> str:
+    ttype = "C" if e.transaction_type == TransactionType.CREDIT else "D"
+    return f"{e.transaction_date.strftime('%Y-%m-%d')}|{ttype}|{e.amount:.2f}|{_clean_details(e.details)}"
+
+
+def _fit_lines(rows: List[Expense], budget: int, skip_ids=()) -> Tuple[List[str], List[int], int]:
+    """Lines (oldest first) for as many rows as fit in the budget, in the order
+    given; returns them with the listed ids and the tokens used"""
+    listed, used = [], 0
+    for e in rows:
+        if e.id in skip_ids:
+            continue
+        line = _toon_line(e)
+        tokens = estimate_tokens(line) + 1
+        if used + tokens > budget:
+            break
+        listed.append((e.transaction_date, e.id, line))
+        used += tokens
+    listed.sort(key=lambda item: item[0])
+    return [line for _, _, line in listed], [expense_id for _, expense_id, _ in listed], used
+
+
+def build_context_prefix(db: Session, user_id: int, provider: LLMProvider, budget: int) -> ContextPrefix:
+    """Everything the model needs to know about the user, independent of the question"""
+    user = get_user_details(user_id, db)
+    currency = user.currency or "INR"
+
+    totals = get_lifetime_totals(db, user_id)
+    months = last_n_months(settings.AI_CONTEXT_MONTHS)
+    monthly = get_period_totals(db, user_id, months)
+    window_start = get_month_range(*months[0])[0]
+    top_details = get_top_details(db, user_id, window_start, limit=settings.AI_CONTEXT_TOP_DETAILS)
+    active_months = [m for m in months if monthly[m]["credit"] or monthly[m]["debit"]]
+
+    monthly_lines = "\n".join(
+        f"{_month_label(*m)}|{monthly[m]['credit']:.2f}|{monthly[m]['debit']:.2f}|{monthly[m]['net']:.2f}"
+        for m in active_months
+    ) or "(no activity)"
+    top_lines = "\n".join(
+        f"{_clean_details(details)}|{amount:.2f}|{count}"
+        for details, amount, count in top_details
+    ) or "(none)"
+
+    head = f"""You are a personal finance advisor. Use ONLY the user's data below.
+
+RULES:
+- Use exact data only
+- Never invent transactions
+- Be accurate and concise
+
+Today: {date.today().isoformat()}
+Amounts in {currency}; C=Income, D=Expense
+
+=== USER FINANCIAL DATA ===
+Income: {totals['credit']:.2f} | Expenses: {totals['debit']:.2f} | Net: {totals['net']:.2f}
+Total transactions: {totals['count']}
+
+Monthly totals, last {len(months)} months, months without activity omitted (month|income|expenses|net):
+{monthly_lines}
+
+Top spending since {window_start.strftime('%Y-%m-%d')} (details|total|count):
+{top_lines}
+
+Recent transactions (date|C/D|amount|details):
+"""
+    recent_rows = settings.AI_CONTEXT_RECENT_ROWS_COMPACT if _compact(provider) else settings.AI_CONTEXT_RECENT_ROWS
+    head_tokens = estimate_tokens(head)
+    # Reserve room for the note line below
+    lines, listed_ids, used = _fit_lines(
+        get_recent_expenses(db, user_id, recent_rows), budget - head_tokens - 20
+    )
+    note = f"\n(Showing the latest {len(lines)} of {totals['count']} transactions)" if totals["count"] > len(lines) else ""
+    text = head + ("\n".join(lines) or "(none)") + note + "\n"
+    return ContextPrefix(text, estimate_tokens(text), listed_ids)
+
+
+def _prefix_key(user_id: int, provider: LLMProvider, budget: PromptBudget, data_version: int, currency: str) -> str:
+    # The currency is part of the prefix but not of the data version
+    identity = json.dumps([
+        user_id, currency, provider.name, provider.model, budget.prefix, data_version, date.today().isoformat()
+    ])
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def get_context_prefix(
+    db: Session, user_id: int, provider: LLMProvider, budget: PromptBudget, data_version: int
+) -> Tuple[ContextPrefix, bool]:
+    """The user's context prefix and whether it came from the cache"""
+    currency = get_user_details(user_id, db).currency or "INR"
+    key = _prefix_key(user_id, provider, budget, data_version, currency)
+    cached = _prefix_cache.get(key)
+    if cached is not None:
+        return ContextPrefix(*cached), True
+    prefix = build_context_prefix(db, user_id, provider, budget.prefix)
+    _prefix_cache.set(key, list(prefix), settings.AI_PROMPT_PREFIX_CACHE_TTL_SECONDS)
+    return prefix, False
+
+
+def build_question_suffix(
+    db: Session, user_id: int, message: str, provider: LLMProvider, budget: int, skip_ids
+) -> str:
+    """Transactions matching the question that the prefix does not list, then the question"""
+    ending = f"\nQuestion: {message}\n\nAnswer:"
+    budget -= estimate_tokens(ending)
+    relevant_rows = settings.AI_CONTEXT_RELEVANT_ROWS_COMPACT if _compact(provider) else settings.AI_CONTEXT_RELEVANT_ROWS
+    relevant = search_expenses(db, user_id, message, relevant_rows)
+    if not relevant or budget <= 0:
+        return ending
+
+    totals = get_details_totals(db, user_id, [e.details for e in relevant])[:settings.AI_CONTEXT_TOP_DETAILS]
+    totals_text = "\nAll-time totals for those details (details|C/D|total|count):\n" + "\n".join(
+        f"{_clean_details(details)}|{'C' if ttype == TransactionType.CREDIT.value else 'D'}|{amount:.2f}|{count}"
+        for details, ttype, amount, count in totals
+    ) + "\n"
+    totals_tokens = estimate_tokens(totals_text)
+    if totals_tokens > budget // 2:
+        totals_text, totals_tokens = "", 0
+
+    heading = "\nOther transactions matching the question (date|C/D|amount|details):\n"
+    lines, _, _ = _fit_lines(relevant, budget - totals_tokens - estimate_tokens(heading), skip_ids=set(skip_ids))
+    if not lines:
+        return totals_text + ending
+    return heading + "\n".join(lines) + "\n" + totals_text + ending
+
+
+def build_prompt(
+    message: str, user_id: int, db: Session, provider: LLMProvider, data_version: int
+) -> str:
+    """Full prompt: cached context prefix followed by the question suffix"""
+    budget = prompt_budget(provider)
+    prefix, cached = get_context_prefix(db, user_id, provider, budget, data_version)
+    suffix = build_question_suffix(
+        db, user_id, message, provider, budget.prompt - prefix.tokens, prefix.listed_ids
+    )
+    suffix_tokens = estimate_tokens(suffix)
+    used = prefix.tokens + suffix_tokens
+    logger.info(
+        f"AI prompt for user {user_id} via {provider.name}: prefix {prefix.tokens} tokens "
+        f"({'cached' if cached else 'built'}), question {suffix_tokens}, total {used}/{budget.prompt} "
+        f"(context {budget.context}, reply {budget.reply})"
+    )
+    if used > budget.prompt:
+        logger.warning(f"AI prompt for user {user_id} exceeds its budget by {used - budget.prompt} tokens")
+    return prefix.text + suffix
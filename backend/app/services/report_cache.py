@@ -0,0 +1,94 @@
+"""
+Content-addressed cache of generated report files.
+
+A report is identified by who asked, the profile fields printed on it, what
+they asked for and the user's data version, so any expense write or profile
+change makes older artifacts unreachable; they age out
+through LRU eviction bounded by REPORT_CACHE_MAX_FILES/REPORT_CACHE_MAX_BYTES.
+The directory is outside /static so cached reports are never served directly.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from app.core.config import settings
+from app.services.report_service import ReportOwner
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_DIR = Path(settings.REPORT_CACHE_DIR or Path(__file__).resolve().parent.parent / "report_cache")
+
+
+def report_cache_key(
+    owner: ReportOwner,
+    start_date: datetime,
+    end_date: datetime,
+    transaction_type: Optional[str],
+    fmt: str,
+    data_version: int
+) -> str:
+    # Keyed with SECRET_KEY so a file name cannot be derived from the request
+    identity = json.dumps([
+        owner.id, owner.full_name, owner.email, owner.currency,
+        start_date.isoformat(), end_date.isoformat(), transaction_type, fmt, data_version
+    ])
+    return hmac.new(settings.SECRET_KEY.encode(), identity.encode(), hashlib.sha256).hexdigest()
+
+
+def _path(key: str, fmt: str) -> Path:
+    return REPORT_CACHE_DIR / f"{key}.{fmt}"
+
+
+def cached_report(key: str, fmt: str) -> Optional[str]:
+    """Path of a cached report, marking it recently used, or None on a miss"""
+    if not settings.REPORT_CACHE_ENABLED:
+        return None
+    path = _path(key, fmt)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return str(path)
+
+
+def store_report(key: str, fmt: str, generated_path: str) -> str:
+    """Move a freshly generated report into the cache and return its new path"""
+    if not settings.REPORT_CACHE_ENABLED:
+        return generated_path
+    REPORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _path(key, fmt)
+    shutil.move(generated_path, path)
+    _evict(keep=path)
+    return str(path)
+
+
+def _evict(keep: Path):
+    """Drop least recently used files until the cache is within its limits"""
+    entries = []
+    for path in REPORT_CACHE_DIR.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    count = len(entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if count <= settings.REPORT_CACHE_MAX_FILES and total_bytes <= settings.REPORT_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        count -= 1
+        total_bytes -= size
+        logger.info(f"Evicted cached report {path.name}")
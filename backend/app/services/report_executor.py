@@ -0,0 +1,87 @@
+"""
+Runs report builders (ReportLab/openpyxl, pure CPU for seconds on large
+exports) in a process pool so they never block the API event loop.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ReportTimeout(Exception):
+    pass
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that holds DB connections and scheduler threads is unsafe
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.REPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots_loop is not loop:
+        _slots = asyncio.Semaphore(settings.REPORT_WORKERS)
+        _slots_loop = loop
+    return _slots
+
+
+def _release_slot(loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore):
+    try:
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:
+        # Loop already closed during shutdown; nothing is waiting for the slot
+        pass
+
+
+async def run_report_job(fn, *args):
+    """Run fn(*args) in a report worker process and return its result.
+    At most REPORT_WORKERS jobs run at once; others wait for a slot.
+    Raises ReportTimeout when waiting plus building exceeds REPORT_TIMEOUT_SECONDS."""
+    loop = asyncio.get_running_loop()
+    slots = _get_slots()
+
+    async def _run():
+        await slots.acquire()
+        try:
+            future = _get_pool().submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        # A timed-out job keeps its process busy, so its slot is only freed
+        # once the process actually finishes
+        future.add_done_callback(lambda _: _release_slot(loop, slots))
+        return await asyncio.wrap_future(future)
+
+    try:
+        return await asyncio.wait_for(_run(), settings.REPORT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise ReportTimeout(f"Report generation took longer than {settings.REPORT_TIMEOUT_SECONDS}s")
+    except BrokenProcessPool:
+        logger.error("Report worker process died; restarting the report pool")
+        shutdown_report_pool()
+        raise
+
+
+def shutdown_report_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,322 @@
+"""
+Background report jobs: large PDF/Excel reports are queued in the
+report_jobs table and built by a dispatcher running in each API process, so
+requests return immediately and jobs survive restarts.
+
+Concurrency is capped globally (REPORT_JOB_MAX_RUNNING) and per user
+(REPORT_JOB_MAX_RUNNING_PER_USER). Both limits are checked in the same
+statement that claims a job; on PostgreSQL claims are serialised with an
+advisory lock so the limits also hold across several API processes.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.expense import TransactionType
+from app.models.report_job import ReportJob
+from app.models.user import User
+from app.services.data_version import get_data_version
+from app.services.report_cache import report_cache_key, cached_report, store_report
+from app.services.report_executor import run_report_job
+from app.services.report_service import ReportOwner, generate_pdf_report, generate_excel_report, report_query
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = ("queued", "running")
+# Arbitrary key for pg_advisory_xact_lock around job claims
+_CLAIM_LOCK_ID = 7305601
+
+
+class ReportJobLimit(Exception):
+    pass
+
+
+def report_owner(user: User) -> ReportOwner:
+    return ReportOwner(id=user.id, full_name=user.full_name, email=user.email, currency=user.currency)
+
+
+async def build_report(
+    owner: ReportOwner,
+    fmt: str,
+    start_date: datetime,
+    end_date: datetime,
+    transaction_type: Optional[str],
+    cache_key: str
+) -> str:
+    """Generate a report in the worker pool and store it in the report cache"""
+    if fmt == "pdf":
+        # Short-lived session: no connection is held while the worker renders
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(report_query(
+                owner.id, start_date, end_date,
+                TransactionType(transaction_type) if transaction_type else None
+            ))
+            rows = [(date, details, txn_type.value, amount) for date, details, txn_type, amount in result]
+        logger.debug(f"Report {cache_key}: {len(rows)} expenses")
+        generated = await run_report_job(generate_pdf_report, rows, owner)
+    else:
+        # The worker streams rows from the database itself
+        generated = await run_report_job(generate_excel_report, owner, start_date, end_date, transaction_type)
+    return store_report(cache_key, fmt, generated)
+
+
+def report_job_file(job: ReportJob) -> Optional[str]:
+    """Downloadable file of a finished job, or None once it has been evicted"""
+    if job.status != "succeeded":
+        return None
+    path = cached_report(job.cache_key, job.format) or job.file_path
+    if path and os.path.exists(path):
+        return path
+    return None
+
+
+async def _find_job(db: AsyncSession, user_id: int, cache_key: str, statuses) -> Optional[ReportJob]:
+    result = await db.execute(
+        select(ReportJob).where(
+            ReportJob.user_id == user_id,
+            ReportJob.cache_key == cache_key,
+            ReportJob.status.in_(statuses)
+        ).order_by(ReportJob.created_at.desc()).limit(1)
+    )
+    return result.scalars().first()
+
+
+async def enqueue_report_job(
+    db: AsyncSession,
+    user: User,
+    fmt: str,
+    start_date: datetime,
+    end_date: datetime,
+    transaction_type: Optional[str]
+) -> ReportJob:
+    """Queue a report build, returning an identical pending or finished job when there is one"""
+    user_id = user.id  # user is expired by a rollback below
+    version = await db.run_sync(get_data_version, user_id)
+    cache_key = report_cache_key(report_owner(user), start_date, end_date, transaction_type, fmt, version)
+
+    existing = await _find_job(db, user_id, cache_key, PENDING_STATUSES + ("succeeded",))
+    if existing is not None and (existing.status != "succeeded" or report_job_file(existing)):
+        return existing
+
+    pending = await db.scalar(
+        select(func.count()).select_from(ReportJob).where(
+            ReportJob.user_id == user_id, ReportJob.status.in_(PENDING_STATUSES)
+        )
+    )
+    if pending >= settings.REPORT_JOB_MAX_PENDING_PER_USER:
+        raise ReportJobLimit(
+            f"You already have {pending} reports in progress; wait for one to finish"
+        )
+
+    job = ReportJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        format=fmt,
+        start_date=start_date,
+        end_date=end_date,
+        transaction_type=transaction_type,
+        cache_key=cache_key,
+        status="queued",
+        progress=0,
+        attempts=0,
+    )
+    # Already built by an earlier request for the same data
+    cached = cached_report(cache_key, fmt)
+    if cached is not None:
+        job.status = "succeeded"
+        job.progress = 100
+        job.file_path = cached
+        job.finished_at = datetime.now(timezone.utc)
+
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request queued the same report first
+        await db.rollback()
+        existing = await _find_job(db, user_id, cache_key, PENDING_STATUSES)
+        if existing is None:
+            raise
+        return existing
+    await db.refresh(job)
+    if job.status == "queued":
+        report_job_runner.notify()
+    return job
+
+
+class ReportJobRunner:
+    def __init__(self):
+        self._worker: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._last_sweep = 0.0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                if time.monotonic() - self._last_sweep >= 60:
+                    await self._sweep()
+                    self._last_sweep = time.monotonic()
+                await self._dispatch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Report job dispatch failed")
+            # Polling also picks up jobs queued by other API processes
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.REPORT_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _sweep(self):
+        """Requeue jobs orphaned by a crashed process and purge old finished jobs"""
+        now = datetime.now(timezone.utc)
+        # A live job is failed by its runner once REPORT_TIMEOUT_SECONDS pass,
+        # so anything still "running" well beyond that lost its process
+        stale = now - timedelta(seconds=settings.REPORT_TIMEOUT_SECONDS + 60)
+        async with AsyncSessionLocal() as db:
+            running_here = list(self._tasks)
+            orphaned = [ReportJob.status == "running", ReportJob.started_at < stale]
+            if running_here:
+                orphaned.append(ReportJob.id.notin_(running_here))
+            await db.execute(
+                update(ReportJob).where(*orphaned, ReportJob.attempts >= settings.REPORT_JOB_MAX_ATTEMPTS)
+                .values(status="failed", error="Report worker stopped before finishing", finished_at=now)
+            )
+            requeued = await db.execute(
+                update(ReportJob).where(*orphaned).values(status="queued", progress=0)
+            )
+            if requeued.rowcount:
+                logger.warning(f"Requeued {requeued.rowcount} orphaned report jobs")
+            await db.execute(
+                delete(ReportJob).where(
+                    ReportJob.status.in_(("succeeded", "failed")),
+                    ReportJob.finished_at < now - timedelta(days=settings.FILE_RETENTION_DAYS)
+                )
+            )
+            await db.commit()
+
+    async def _dispatch(self):
+        if len(self._tasks) >= settings.REPORT_JOB_MAX_RUNNING:
+            return
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ReportJob.id, ReportJob.user_id)
+                .where(ReportJob.status == "queued")
+                .order_by(ReportJob.created_at)
+                .limit(100)
+            )
+            queued = result.all()
+            for job_id, user_id in queued:
+                if len(self._tasks) >= settings.REPORT_JOB_MAX_RUNNING:
+                    break
+                if await self._claim(db, job_id, user_id):
+                    self._tasks[job_id] = asyncio.create_task(self._execute(job_id))
+
+    async def _claim(self, db: AsyncSession, job_id: str, user_id: int) -> bool:
+        """Move a queued job to running if the global and per-user limits allow it"""
+        if db.get_bind().dialect.name == "postgresql":
+            await db.execute(select(func.pg_advisory_xact_lock(_CLAIM_LOCK_ID)))
+        others = aliased(ReportJob)
+        running = select(func.count()).select_from(others).where(
+            others.status == "running"
+        ).scalar_subquery()
+        running_for_user = select(func.count()).select_from(others).where(
+            others.status == "running", others.user_id == user_id
+        ).scalar_subquery()
+        result = await db.execute(
+            update(ReportJob).where(
+                ReportJob.id == job_id,
+                ReportJob.status == "queued",
+                running < settings.REPORT_JOB_MAX_RUNNING,
+                running_for_user < settings.REPORT_JOB_MAX_RUNNING_PER_USER,
+            ).values(
+                status="running",
+                progress=10,
+                attempts=ReportJob.attempts + 1,
+                started_at=datetime.now(timezone.utc)
+            )
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def _execute(self, job_id: str):
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(ReportJob, job_id)
+                user = await db.get(User, job.user_id)
+                owner = report_owner(user)
+                job.progress = 25
+                await db.commit()
+
+            file_path = cached_report(job.cache_key, job.format)
+            if file_path is None:
+                file_path = await build_report(
+                    owner, job.format, job.start_date, job.end_date, job.transaction_type, job.cache_key
+                )
+            await self._finish(job_id, status="succeeded", progress=100, file_path=file_path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Report job {job_id} failed")
+            await self._finish(job_id, status="failed", error=str(e)[:1000])
+        finally:
+            self._tasks.pop(job_id, None)
+            self.notify()
+
+    async def _finish(self, job_id: str, **values):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ReportJob).where(ReportJob.id == job_id)
+                .values(finished_at=datetime.now(timezone.utc), **values)
+            )
+            await db.commit()
+
+    def metrics(self) -> dict:
+        return {"running": len(self._tasks), "max_running": settings.REPORT_JOB_MAX_RUNNING}
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        interrupted = list(self._tasks)
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        if interrupted:
+            # Hand interrupted jobs back to the queue for the next process to pick up
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(ReportJob).where(ReportJob.id.in_(interrupted), ReportJob.status == "running")
+                    .values(status="queued", progress=0)
+                )
+                await db.commit()
+
+
+report_job_runner = ReportJobRunner()
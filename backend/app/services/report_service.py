@@ -1,21 +1,141 @@
-import pandas as pd
+from openpyxl import Workbook
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 import os
 from datetime import datetime
+from itertools import groupby
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.expense import Expense, TransactionType
+
+# These run in report worker processes (see report_executor), so they take
+# plain picklable values rather than ORM objects.
+
+class ReportOwner(NamedTuple):
+    id: int
+    full_name: Optional[str]
+    email: str
+    currency: str
+
+# (transaction_date, details, transaction type value, amount)
+ReportRow = Tuple[datetime, Optional[str], str, float]
+
+
+def report_query(user_id: int, start_date: datetime, end_date: datetime, transaction_type: Optional[TransactionType]):
+    """Report columns for a half-open date range, newest first"""
+    query = select(
+        Expense.transaction_date, Expense.details, Expense.transaction_type, Expense.amount
+    ).where(
+        Expense.user_id == user_id,
+        Expense.transaction_date >= start_date,
+        Expense.transaction_date < end_date
+    )
+    if transaction_type:
+        query = query.where(Expense.transaction_type == transaction_type)
+    return query.order_by(Expense.transaction_date.desc(), Expense.created_at.desc())
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 REPORT_DIR = BASE_DIR / "static" / "reports"
 REPORT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Built once per process and shared by every report
+STYLES = getSampleStyleSheet()
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 11),
+])
+
+TRANSACTION_HEADER = ['Date', 'Details', 'Type', 'Amount']
+TRANSACTION_COL_WIDTHS = [1.5*inch, 2.5*inch, 1*inch, 1.5*inch]
+TRANSACTION_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+])
+
+SUBTOTAL_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('LINEABOVE', (0, 0), (-1, 0), 0.5, colors.black),
+    ('LINEABOVE', (0, -1), (-1, -1), 0.5, colors.black),
+])
+
+
+def _month_subtotal_table(label: str, credit: float, debit: float, currency: str) -> Table:
+    table = Table([
+        [f"{label} income", f"{currency} {credit:.2f}"],
+        [f"{label} expenses", f"{currency} {debit:.2f}"],
+        [f"{label} net", f"{currency} {credit - debit:.2f}"],
+    ], colWidths=[4.5*inch, 2*inch])
+    table.setStyle(SUBTOTAL_TABLE_STYLE)
+    return table
+
+
+def _transaction_row(row: ReportRow, currency: str) -> list:
+    transaction_date, details, txn_type, amount = row
+    return [
+        transaction_date.strftime('%Y-%m-%d'),
+        details or '-',
+        txn_type.title(),
+        f"{currency} {amount:.2f}"
+    ]
+
+
+def _large_report_story(rows: List[ReportRow], currency: str) -> list:
+    """Per-month sections of fixed-size LongTable chunks, each followed by a
+    subtotal, so ReportLab never has to split one huge table"""
+    story = []
+    chunk_rows = settings.PDF_TABLE_CHUNK_ROWS
+    # rows arrive newest first, so each month is one contiguous run
+    for (year, month), month_rows in groupby(rows, key=lambda r: (r[0].year, r[0].month)):
+        label = datetime(year, month, 1).strftime('%B %Y')
+        story.append(Paragraph(label, STYLES['Heading2']))
+
+        credit = debit = 0.0
+        chunk = [TRANSACTION_HEADER]
+        for row in month_rows:
+            if row[2] == 'credit':
+                credit += row[3]
+            else:
+                debit += row[3]
+            chunk.append(_transaction_row(row, currency))
+            if len(chunk) > chunk_rows:
+                story.append(LongTable(chunk, colWidths=TRANSACTION_COL_WIDTHS, style=TRANSACTION_TABLE_STYLE, repeatRows=1))
+                chunk = [TRANSACTION_HEADER]
+        if len(chunk) > 1:
+            story.append(LongTable(chunk, colWidths=TRANSACTION_COL_WIDTHS, style=TRANSACTION_TABLE_STYLE, repeatRows=1))
+
+        story.append(Spacer(1, 6))
+        story.append(_month_subtotal_table(label, credit, debit, currency))
+        story.append(Spacer(1, 12))
+    return story
+
 
-def generate_pdf_report(expenses, user):
+def generate_pdf_report(rows: List[ReportRow], user: ReportOwner):
     filename = f"report_{user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     filepath = REPORT_DIR / filename
 
@@ -23,17 +143,16 @@ def generate_pdf_report(expenses, user):
 
     try:
         doc = SimpleDocTemplate(str(filepath), pagesize=letter)
-        styles = getSampleStyleSheet()
         story = []
 
         # Title
-        title = Paragraph(f"Expense Report - {user.full_name or user.email}", styles['Title'])
+        title = Paragraph(f"Expense Report - {user.full_name or user.email}", STYLES['Title'])
         story.append(title)
         story.append(Spacer(1, 12))
 
         # Summary
-        total_credit = sum(e.amount for e in expenses if e.transaction_type.value == 'credit')
-        total_debit = sum(e.amount for e in expenses if e.transaction_type.value == 'debit')
+        total_credit = sum(amount for _, _, txn_type, amount in rows if txn_type == 'credit')
+        total_debit = sum(amount for _, _, txn_type, amount in rows if txn_type == 'debit')
         net = total_credit - total_debit
 
         summary_data = [
@@ -43,44 +162,17 @@ def generate_pdf_report(expenses, user):
         ]
 
         summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 11),
-        ]))
+        summary_table.setStyle(SUMMARY_TABLE_STYLE)
         story.append(summary_table)
         story.append(Spacer(1, 12))
 
         # Transactions
-        if expenses:
-            data = [['Date', 'Details', 'Type', 'Amount']]
-            for e in expenses:
-                data.append([
-                    e.transaction_date.strftime('%Y-%m-%d'),
-                    e.details or '-',
-                    e.transaction_type.value.title(),
-                    f"{user.currency} {e.amount:.2f}"
-                ])
-
-            table = Table(data, colWidths=[1.5*inch, 2.5*inch, 1*inch, 1.5*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-            ]))
+        if len(rows) > settings.PDF_LARGE_REPORT_ROWS:
+            story.extend(_large_report_story(rows, user.currency))
+        elif rows:
+            data = [TRANSACTION_HEADER] + [_transaction_row(row, user.currency) for row in rows]
+            table = Table(data, colWidths=TRANSACTION_COL_WIDTHS, repeatRows=1)
+            table.setStyle(TRANSACTION_TABLE_STYLE)
             story.append(table)
 
         # Build PDF
@@ -96,43 +188,46 @@ def generate_pdf_report(expenses, user):
         print(f"PDF generation failed: {e}")
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
+        raise RuntimeError(f"PDF generation failed: {str(e)}")
 
 
-def generate_excel_report(expenses, user):
+def generate_excel_report(
+    user: ReportOwner,
+    start_date: datetime,
+    end_date: datetime,
+    transaction_type: Optional[str] = None
+):
+    """Stream the user's transactions straight from the database into a
+    write-only workbook; memory stays flat whatever the row count"""
     filename = f"report_{user.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     filepath = REPORT_DIR / filename
 
     print(f"Generating Excel: {filepath}")
-    
-    # Ensure /tmp directory exists
-    # os.makedirs("/tmp", exist_ok=True)
-    
-    data = []
-    for expense in expenses:
-        data.append({
-            'Date': expense.transaction_date.strftime('%Y-%m-%d'),
-            'Details': expense.details,
-            'Type': expense.transaction_type.value.title(),
-            'Amount': expense.amount,
-            'Currency': user.currency
-        })
-    
-    df = pd.DataFrame(data)
-    
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Transactions', index=False)
-        
-        # Summary sheet
-        total_credit = sum(e.amount for e in expenses if e.transaction_type.value == 'credit')
-        total_debit = sum(e.amount for e in expenses if e.transaction_type.value == 'debit')
-        
-        summary_df = pd.DataFrame({
-            'Metric': ['Total Income', 'Total Expenses', 'Net Amount'],
-            'Amount': [total_credit, total_debit, total_credit - total_debit],
-            'Currency': [user.currency] * 3
-        })
-        
-        summary_df.to_excel(writer, sheet_name='Summary', index=False)
-    
-    return filepath
\ No newline at end of file
+
+    workbook = Workbook(write_only=True)
+    transactions = workbook.create_sheet('Transactions')
+    transactions.append(['Date', 'Details', 'Type', 'Amount', 'Currency'])
+
+    total_credit = total_debit = 0.0
+    query = report_query(
+        user.id, start_date, end_date,
+        TransactionType(transaction_type) if transaction_type else None
+    ).execution_options(yield_per=settings.REPORT_YIELD_PER)
+    with SessionLocal() as db:
+        for transaction_date, details, txn_type, amount in db.execute(query):
+            if txn_type == TransactionType.CREDIT:
+                total_credit += amount
+            else:
+                total_debit += amount
+            transactions.append([
+                transaction_date.strftime('%Y-%m-%d'), details, txn_type.value.title(), amount, user.currency
+            ])
+
+    summary = workbook.create_sheet('Summary')
+    summary.append(['Metric', 'Amount', 'Currency'])
+    summary.append(['Total Income', total_credit, user.currency])
+    summary.append(['Total Expenses', total_debit, user.currency])
+    summary.append(['Net Amount', total_credit - total_debit, user.currency])
+
+    workbook.save(filepath)
+    return str(filepath)
@@ -0,0 +1,169 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, extract, cast, Integer, insert as generic_insert
+from sqlalchemy.orm import Session
+from app.models.expense import Expense
+from app.models.monthly_rollup import MonthlyRollup
+from app.services.data_version import bump_data_versions
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (user_id, year, month, transaction_type), followed by the amount and row count
+RollupKey = Tuple[int, int, int, str]
+RollupDelta = Tuple[RollupKey, float, int]
+
+
+def _period_columns():
+    """Year and month of an expense, evaluated by the database like the stats queries"""
+    return (
+        cast(extract('year', Expense.transaction_date), Integer),
+        cast(extract('month', Expense.transaction_date), Integer),
+    )
+
+
+def _type_value(transaction_type) -> str:
+    return getattr(transaction_type, "value", transaction_type)
+
+
+def collect_rollup_deltas(db: Session, *criteria) -> List[RollupDelta]:
+    """Group the expenses matching `criteria` into per-month rollup contributions"""
+    year_col, month_col = _period_columns()
+    rows = db.query(
+        Expense.user_id, year_col, month_col, Expense.transaction_type,
+        func.sum(Expense.amount), func.count(Expense.id)
+    ).filter(*criteria).group_by(
+        Expense.user_id, year_col, month_col, Expense.transaction_type
+    ).all()
+    return [
+        ((user_id, int(year), int(month), _type_value(ttype)), float(amount or 0), int(count))
+        for user_id, year, month, ttype, amount, count in rows
+    ]
+
+
+def _upsert_statement(db: Session, rows: List[dict]):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    table = MonthlyRollup.__table__
+    stmt = insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.year, table.c.month, table.c.transaction_type],
+        set_={
+            "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+            "txn_count": table.c.txn_count + stmt.excluded.txn_count,
+            "updated_at": func.now(),
+        },
+    )
+
+
+def apply_rollup_deltas(
+    db: Session,
+    added: Iterable[RollupDelta] = (),
+    removed: Iterable[RollupDelta] = ()
+):
+    """Add `added` and subtract `removed` from the rollups inside the caller's transaction.
+    Every expense write comes through here, so it also bumps the affected users'
+    data versions (even for edits that leave the totals unchanged)."""
+    merged: Dict[RollupKey, list] = defaultdict(lambda: [0.0, 0])
+    touched_users = set()
+    for key, amount, count in added:
+        merged[key][0] += amount
+        merged[key][1] += count
+        touched_users.add(key[0])
+    for key, amount, count in removed:
+        merged[key][0] -= amount
+        merged[key][1] -= count
+        touched_users.add(key[0])
+    bump_data_versions(db, touched_users)
+
+    rows = [
+        {
+            "user_id": key[0], "year": key[1], "month": key[2], "transaction_type": key[3],
+            "total_amount": amount, "txn_count": count,
+        }
+        for key, (amount, count) in merged.items()
+        if count != 0 or amount != 0
+    ]
+    if not rows:
+        return
+
+    stmt = _upsert_statement(db, rows)
+    if stmt is not None:
+        db.execute(stmt)
+        return
+
+    # Dialects without ON CONFLICT support fall back to lock-then-write
+    for row in rows:
+        rollup = db.query(MonthlyRollup).filter_by(
+            user_id=row["user_id"], year=row["year"], month=row["month"],
+            transaction_type=row["transaction_type"]
+        ).with_for_update().first()
+        if rollup is None:
+            db.add(MonthlyRollup(**row))
+        else:
+            rollup.total_amount += row["total_amount"]
+            rollup.txn_count += row["txn_count"]
+    db.flush()
+
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute rollups from raw expenses; returns the number of rollup rows written"""
+    rollup_query = db.query(MonthlyRollup)
+    if user_id is not None:
+        rollup_query = rollup_query.filter(MonthlyRollup.user_id == user_id)
+    rollup_query.delete(synchronize_session=False)
+
+    year_col, month_col = _period_columns()
+    source = db.query(
+        Expense.user_id, year_col, month_col, Expense.transaction_type,
+        func.sum(Expense.amount), func.count(Expense.id)
+    )
+    if user_id is not None:
+        source = source.filter(Expense.user_id == user_id)
+    source = source.group_by(Expense.user_id, year_col, month_col, Expense.transaction_type)
+
+    result = db.execute(
+        generic_insert(MonthlyRollup).from_select(
+            ["user_id", "year", "month", "transaction_type", "total_amount", "txn_count"],
+            source.statement,
+        )
+    )
+    logger.info(f"Rebuilt {result.rowcount} monthly rollup rows")
+    return result.rowcount
+
+
+def find_rollup_drift(db: Session, user_id: Optional[int] = None, tolerance: float = 0.005) -> List[dict]:
+    """Compare stored rollups with totals recomputed from raw expenses"""
+    criteria = [Expense.user_id == user_id] if user_id is not None else []
+    expected = {key: (amount, count) for key, amount, count in collect_rollup_deltas(db, *criteria)}
+
+    rollup_query = db.query(MonthlyRollup)
+    if user_id is not None:
+        rollup_query = rollup_query.filter(MonthlyRollup.user_id == user_id)
+    actual = {
+        (r.user_id, r.year, r.month, r.transaction_type): (r.total_amount or 0.0, r.txn_count or 0)
+        for r in rollup_query.all()
+    }
+
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        expected_amount, expected_count = expected.get(key, (0.0, 0))
+        actual_amount, actual_count = actual.get(key, (0.0, 0))
+        if expected_count != actual_count or abs(expected_amount - actual_amount) > tolerance:
+            drift.append({
+                "user_id": key[0],
+                "year": key[1],
+                "month": key[2],
+                "transaction_type": key[3],
+                "expected_amount": expected_amount,
+                "actual_amount": actual_amount,
+                "expected_count": expected_count,
+                "actual_count": actual_count,
+            })
+    return drift
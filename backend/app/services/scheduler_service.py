@@ -7,6 +7,9 @@ from app.services.notification_service import (
     get_users_for_daily_reminder
 )
 from app.services.cleanup_service import cleanup_old_files
+from app.core.config import settings
+from app.core.db_pool import report_long_held_connections
+from app.services.llm_providers import keep_llm_warm
 import logging
 
 logger = logging.getLogger(__name__)
@@ -50,6 +53,14 @@ def start_scheduler():
         replace_existing=True
     )
     
+    # Report database connections that were never returned
+    scheduler.add_job(
+        report_long_held_connections,
+        CronTrigger(minute='*'),
+        id='db_pool_leak_check',
+        replace_existing=True
+    )
+    
     # Clean up old files daily at 2 AM
     scheduler.add_job(
         cleanup_old_files,
@@ -58,6 +69,19 @@ def start_scheduler():
         replace_existing=True
     )
     
+    # Keep the local model loaded through business hours
+    if settings.LLM_PROVIDER == "ollama" and settings.OLLAMA_KEEP_WARM_ENABLED:
+        scheduler.add_job(
+            keep_llm_warm,
+            CronTrigger(
+                day_of_week=settings.OLLAMA_KEEP_WARM_DAYS,
+                hour=settings.OLLAMA_KEEP_WARM_HOURS,
+                minute=f"*/{settings.OLLAMA_KEEP_WARM_MINUTES}"
+            ),
+            id='llm_keep_warm',
+            replace_existing=True
+        )
+    
     scheduler.start()
     logger.info("Scheduler started successfully")
 
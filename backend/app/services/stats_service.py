@@ -0,0 +1,235 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func, extract, or_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.expense import Expense, TransactionType
+from app.models.monthly_rollup import MonthlyRollup
+
+Month = Tuple[int, int]
+
+
+def get_month_range(year: int, month: int) -> Tuple[datetime, datetime]:
+    """Return the half-open [start, end) datetime range covering a month"""
+    start_date = datetime(year, month, 1)
+    if month == 12:
+        end_date = datetime(year + 1, 1, 1)
+    else:
+        end_date = datetime(year, month + 1, 1)
+    return start_date, end_date
+
+
+def last_n_months(count: int, today: Optional[datetime] = None) -> List[Month]:
+    """Return the last `count` (year, month) pairs, oldest first, ending with the current month"""
+    today = today or datetime.now()
+    months = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        months.append((year, month))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    months.reverse()
+    return months
+
+
+def _next_month(year: int, month: int) -> Month:
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _merge_month_ranges(months: Iterable[Month]) -> List[Tuple[datetime, datetime]]:
+    """Collapse consecutive months into as few [start, end) ranges as possible"""
+    ranges = []
+    previous = None
+    for year, month in sorted(set(months)):
+        start_date, end_date = get_month_range(year, month)
+        if previous is not None and _next_month(*previous) == (year, month):
+            ranges[-1] = (ranges[-1][0], end_date)
+        else:
+            ranges.append((start_date, end_date))
+        previous = (year, month)
+    return ranges
+
+
+def _empty_totals(months: List[Month]) -> Dict[Month, dict]:
+    return {m: {"credit": 0.0, "debit": 0.0, "net": 0.0} for m in months}
+
+
+def _finish_totals(totals: Dict[Month, dict]) -> Dict[Month, dict]:
+    for period in totals.values():
+        period["net"] = period["credit"] - period["debit"]
+    return totals
+
+
+def get_period_totals(db: Session, user_id: int, months: Iterable[Month]) -> Dict[Month, dict]:
+    """Credit, debit and net totals for each requested month"""
+    if settings.USE_MONTHLY_ROLLUPS:
+        return get_rollup_period_totals(db, user_id, months)
+    return compute_period_totals(db, user_id, months)
+
+
+def get_rollup_period_totals(db: Session, user_id: int, months: Iterable[Month]) -> Dict[Month, dict]:
+    """Read per-month totals from the monthly_rollups table, one row per (month, type)"""
+    months = list(months)
+    totals = _empty_totals(months)
+    if not months:
+        return totals
+
+    rows = db.query(
+        MonthlyRollup.year, MonthlyRollup.month,
+        MonthlyRollup.transaction_type, MonthlyRollup.total_amount
+    ).filter(
+        MonthlyRollup.user_id == user_id,
+        or_(*[
+            (MonthlyRollup.year == year) & (MonthlyRollup.month == month)
+            for year, month in set(months)
+        ])
+    ).all()
+
+    for year, month, transaction_type, amount in rows:
+        key = "credit" if transaction_type == TransactionType.CREDIT.value else "debit"
+        totals[(year, month)][key] = float(amount or 0)
+    return _finish_totals(totals)
+
+
+def compute_period_totals(db: Session, user_id: int, months: Iterable[Month]) -> Dict[Month, dict]:
+    """Sum raw expenses for each requested month using a single GROUP BY query"""
+    months = list(months)
+    totals = _empty_totals(months)
+    if not months:
+        return totals
+
+    year_col = extract('year', Expense.transaction_date)
+    month_col = extract('month', Expense.transaction_date)
+    date_filters = [
+        (Expense.transaction_date >= start_date) & (Expense.transaction_date < end_date)
+        for start_date, end_date in _merge_month_ranges(months)
+    ]
+
+    rows = db.query(
+        year_col, month_col, Expense.transaction_type, func.sum(Expense.amount)
+    ).filter(
+        Expense.user_id == user_id,
+        or_(*date_filters)
+    ).group_by(year_col, month_col, Expense.transaction_type).all()
+
+    for year, month, transaction_type, amount in rows:
+        period = totals.get((int(year), int(month)))
+        if period is None:
+            continue
+        key = "credit" if transaction_type == TransactionType.CREDIT else "debit"
+        period[key] = float(amount or 0)
+    return _finish_totals(totals)
+
+
+def get_lifetime_totals(db: Session, user_id: int) -> dict:
+    """All-time credit/debit/net totals and transaction counts"""
+    if settings.USE_MONTHLY_ROLLUPS:
+        rows = db.query(
+            MonthlyRollup.transaction_type, func.sum(MonthlyRollup.total_amount), func.sum(MonthlyRollup.txn_count)
+        ).filter(MonthlyRollup.user_id == user_id).group_by(MonthlyRollup.transaction_type).all()
+    else:
+        rows = db.query(
+            Expense.transaction_type, func.sum(Expense.amount), func.count(Expense.id)
+        ).filter(Expense.user_id == user_id).group_by(Expense.transaction_type).all()
+
+    totals = {"credit": 0.0, "debit": 0.0, "credit_count": 0, "debit_count": 0, "count": 0}
+    for transaction_type, amount, count in rows:
+        key = "credit" if getattr(transaction_type, "value", transaction_type) == TransactionType.CREDIT.value else "debit"
+        totals[key] += float(amount or 0)
+        totals[f"{key}_count"] += int(count or 0)
+        totals["count"] += int(count or 0)
+    totals["net"] = totals["credit"] - totals["debit"]
+    return totals
+
+
+def _range_filters(
+    user_id: int, start: Optional[datetime], end: Optional[datetime], details_like: Iterable[str] = ()
+) -> list:
+    """Filters for a user's expenses in [start, end), served by ix_expenses_user_date_created,
+    optionally only those whose details contain any of `details_like`"""
+    filters = [Expense.user_id == user_id]
+    if start is not None:
+        filters.append(Expense.transaction_date >= start)
+    if end is not None:
+        filters.append(Expense.transaction_date < end)
+    matches = []
+    for text in details_like:
+        escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        matches.append(Expense.details.ilike(f"%{escaped}%", escape="\\"))
+    if matches:
+        filters.append(or_(*matches))
+    return filters
+
+
+def get_range_totals(
+    db: Session,
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    details_like: Iterable[str] = ()
+) -> dict:
+    """Credit/debit/net totals and counts for [start, end), optionally only
+    expenses whose details contain any of `details_like`"""
+    rows = db.query(
+        Expense.transaction_type, func.sum(Expense.amount), func.count(Expense.id)
+    ).filter(*_range_filters(user_id, start, end, details_like)).group_by(Expense.transaction_type).all()
+
+    totals = {"credit": 0.0, "debit": 0.0, "credit_count": 0, "debit_count": 0}
+    for transaction_type, amount, count in rows:
+        key = "credit" if transaction_type == TransactionType.CREDIT else "debit"
+        totals[key] = float(amount or 0)
+        totals[f"{key}_count"] = int(count or 0)
+    totals["net"] = totals["credit"] - totals["debit"]
+    totals["count"] = totals["credit_count"] + totals["debit_count"]
+    return totals
+
+
+def get_details_totals(db: Session, user_id: int, details: Iterable[str]) -> List[Tuple[str, str, float, int]]:
+    """All-time (details, transaction type, total, count) for the given details values"""
+    details = list(set(details))
+    if not details:
+        return []
+    total = func.sum(Expense.amount).label("total")
+    rows = db.query(Expense.details, Expense.transaction_type, total, func.count(Expense.id)).filter(
+        Expense.user_id == user_id, Expense.details.in_(details)
+    ).group_by(Expense.details, Expense.transaction_type).order_by(total.desc()).all()
+    return [
+        (value, getattr(ttype, "value", ttype), float(amount or 0), int(count))
+        for value, ttype, amount, count in rows
+    ]
+
+
+def get_largest_expense(
+    db: Session,
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    transaction_type: TransactionType = TransactionType.DEBIT
+) -> Optional[Expense]:
+    """The single largest expense (or income with CREDIT) in [start, end)"""
+    return db.query(Expense).filter(
+        *_range_filters(user_id, start, end), Expense.transaction_type == transaction_type
+    ).order_by(Expense.amount.desc()).first()
+
+
+def get_top_details(
+    db: Session,
+    user_id: int,
+    since: Optional[datetime],
+    transaction_type: TransactionType = TransactionType.DEBIT,
+    limit: int = 10,
+    until: Optional[datetime] = None
+) -> List[Tuple[str, float, int]]:
+    """Largest (details, total amount, count) groups in [since, until), biggest first"""
+    total = func.sum(Expense.amount).label("total")
+    rows = db.query(Expense.details, total, func.count(Expense.id)).filter(
+        *_range_filters(user_id, since, until),
+        Expense.transaction_type == transaction_type
+    ).group_by(Expense.details).order_by(total.desc()).limit(limit).all()
+    return [(details, float(amount or 0), int(count)) for details, amount, count in rows]
+
+
+def get_recent_expenses(db: Session, user_id: int, limit: int) -> List[Expense]:
+    """The newest `limit` expenses, newest first (served by ix_expenses_user_date_created)"""
+    return db.query(Expense).filter(Expense.user_id == user_id).order_by(
+        Expense.transaction_date.desc(), Expense.created_at.desc()
+    ).limit(limit).all()
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from starlette.concurrency import run_in_threadpool
+from app.core.cache import MemoryCache, create_cache
+from app.core.config import settings
+from app.models.user import User
+
+# Decoded tokens stay per-process: they never change, they only expire
+_token_cache = MemoryCache(settings.TOKEN_CACHE_MAX_ENTRIES)
+_user_cache = create_cache("users", settings.USER_CACHE_MAX_ENTRIES)
+
+_CHANGED_USERS = "changed_user_ids"
+# Never copied into the cache, which may be a Redis shared with other services
+_SECRET_COLUMNS = {"hashed_password"}
+
+
+def get_cached_token_subject(token: str) -> Optional[int]:
+    return _token_cache.get(token)
+
+
+def cache_token_subject(token: str, user_id: int, payload: dict):
+    ttl = settings.TOKEN_CACHE_TTL_SECONDS
+    expires_at = payload.get("exp")
+    if expires_at is not None:
+        ttl = min(ttl, float(expires_at) - time.time())
+    _token_cache.set(token, user_id, ttl)
+
+
+def _snapshot(user: User) -> dict:
+    return {
+        attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs
+        if attr.key not in _SECRET_COLUMNS
+    }
+
+
+def get_cached_user(user_id: int) -> Optional[User]:
+    """A detached User rebuilt from the cache, or None on a miss; its
+    hashed_password is not loaded"""
+    data = _user_cache.get(str(user_id))
+    if data is None:
+        return None
+    user = User(**data)
+    make_transient_to_detached(user)
+    return user
+
+
+def cache_user(user: User):
+    _user_cache.set(str(user.id), _snapshot(user), settings.USER_CACHE_TTL_SECONDS)
+
+
+async def get_cached_user_async(user_id: int) -> Optional[User]:
+    if not _user_cache.blocking:
+        return get_cached_user(user_id)
+    return await run_in_threadpool(get_cached_user, user_id)
+
+
+async def cache_user_async(user: User):
+    if not _user_cache.blocking:
+        cache_user(user)
+        return
+    await run_in_threadpool(_user_cache.set, str(user.id), _snapshot(user), settings.USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id: int):
+    _user_cache.delete(str(user_id))
+
+
+# Any committed change to a User row (profile edits, deactivation, deletion)
+# drops its cache entry, whichever session or code path made the change.
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = {
+        obj.id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, User) and obj.id is not None
+    }
+    if changed:
+        session.info.setdefault(_CHANGED_USERS, set()).update(changed)
+
+
+def _invalidate_users(user_ids):
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    user_ids = session.info.pop(_CHANGED_USERS, ())
+    if not user_ids:
+        return
+    try:
+        # An AsyncSession commits on the event loop's thread
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None and _user_cache.blocking:
+        loop.run_in_executor(None, _invalidate_users, user_ids)
+    else:
+        _invalidate_users(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop(_CHANGED_USERS, None)
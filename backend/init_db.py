@@ -7,6 +7,9 @@ Supports both PostgreSQL and SQLite
 from app.core.database import engine, Base
 from app.models.user import User
 from app.models.expense import Expense
+from app.models.monthly_rollup import MonthlyRollup
+from app.models.data_version import UserDataVersion
+from app.models.report_job import ReportJob
 from app.core.config import settings
 
 def init_database():
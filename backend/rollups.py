@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Monthly rollup maintenance for Expense Advisor
+
+  python rollups.py verify [--user-id N]    report drift between rollups and raw expenses
+  python rollups.py rebuild [--user-id N]   recompute rollups from raw expenses
+"""
+
+import argparse
+import sys
+from app.core.database import SessionLocal
+from app.models.user import User
+from app.models.expense import Expense
+from app.models.monthly_rollup import MonthlyRollup
+from app.services.rollup_service import rebuild_rollups, find_rollup_drift
+
+def verify(user_id=None):
+    """Print every rollup row that disagrees with the raw expenses"""
+    db = SessionLocal()
+    try:
+        drift = find_rollup_drift(db, user_id)
+    finally:
+        db.close()
+
+    if not drift:
+        print("✅ Monthly rollups match raw expenses")
+        return True
+
+    print(f"❌ Found {len(drift)} drifted rollup rows:")
+    for row in drift:
+        print(
+            f"  user={row['user_id']} {row['year']}-{row['month']:02d} {row['transaction_type']}: "
+            f"amount {row['actual_amount']:.2f} (expected {row['expected_amount']:.2f}), "
+            f"count {row['actual_count']} (expected {row['expected_count']})"
+        )
+    return False
+
+def rebuild(user_id=None):
+    """Recompute rollups in a single transaction"""
+    db = SessionLocal()
+    try:
+        drift = find_rollup_drift(db, user_id)
+        rows = rebuild_rollups(db, user_id)
+        db.commit()
+        print(f"✅ Rebuilt {rows} rollup rows ({len(drift)} were drifted)")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Rollup rebuild failed: {e}")
+        return False
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify or rebuild monthly expense rollups")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--user-id", type=int, default=None, help="limit to a single user")
+    args = parser.parse_args()
+
+    ok = verify(args.user_id) if args.command == "verify" else rebuild(args.user_id)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,13 @@
+import os
+
+# Settings are read at import time; the unit tests never connect anywhere
+for name, value in {
+    "DATABASE_URL": "sqlite://",
+    "DB_TYPE": "sqlite",
+    "SECRET_KEY": "test",
+    "SMTP_HOST": "localhost",
+    "SMTP_PORT": "25",
+    "SMTP_USER": "test",
+    "SMTP_PASSWORD": "test",
+}.items():
+    os.environ.setdefault(name, value)
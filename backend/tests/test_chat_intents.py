@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.chat_intents import ALL_TIME, parse_intent
+
+NOW = datetime(2025, 6, 18, 14, 30)
+
+
+@pytest.mark.parametrize("message, kind, start, end, keywords", [
+    ("How much did I spend last month?", "spend", datetime(2025, 5, 1), datetime(2025, 6, 1), ()),
+    ("how much did I spend on rent this month", "spend", datetime(2025, 6, 1), datetime(2025, 7, 1), ("rent",)),
+    ("How much did I spend on food and groceries?", "spend", None, None, ("food", "groceries")),
+    ("total spent on uber, ola or metro in the last 30 days", "spend", datetime(2025, 5, 20), datetime(2025, 6, 19),
+     ("uber", "ola", "metro")),
+    ("how much did I spend on coffee in 2024", "spend", datetime(2024, 1, 1), datetime(2025, 1, 1), ("coffee",)),
+    ("what did I spend in march", "spend", datetime(2025, 3, 1), datetime(2025, 4, 1), ()),
+    ("what did I spend in december", "spend", datetime(2024, 12, 1), datetime(2025, 1, 1), ()),
+    ("how much did I spend in may 2023", "spend", datetime(2023, 5, 1), datetime(2023, 6, 1), ()),
+    ("how much income did I receive from salary last year", "income", datetime(2024, 1, 1), datetime(2025, 1, 1),
+     ("salary",)),
+    ("what is my net savings this year", "net", datetime(2025, 1, 1), datetime(2026, 1, 1), ()),
+    ("income vs expenses last month", "net", datetime(2025, 5, 1), datetime(2025, 6, 1), ()),
+    ("What was my biggest expense this year?", "largest", datetime(2025, 1, 1), datetime(2026, 1, 1), ()),
+    ("largest salary credit", "largest_income", None, None, ()),
+    ("top spending last 3 months", "top", datetime(2025, 4, 1), datetime(2025, 7, 1), ()),
+    ("how many transactions this week", "count", datetime(2025, 6, 16), datetime(2025, 6, 19), ()),
+    ("how many expenses for netflix", "expense_count", None, None, ("netflix",)),
+    ("how many purchases yesterday", "expense_count", datetime(2025, 6, 17), datetime(2025, 6, 18), ()),
+    ("how many payments did I receive in 2024", "count", datetime(2024, 1, 1), datetime(2025, 1, 1), ()),
+])
+def test_parse_intent(message, kind, start, end, keywords):
+    intent = parse_intent(message, NOW)
+    assert intent is not None
+    assert (intent.kind, intent.period.start, intent.period.end, intent.keywords) == (kind, start, end, keywords)
+
+
+@pytest.mark.parametrize("message", [
+    "how many expenses above 2000?",
+    "show expenses over 500 this month",
+    "how much did I spend on items costing more than 1000",
+    "list payments under rs 200",
+    "what transactions exceeded 5000 in 2024",
+    "how can I reduce my spending on food",
+    "should I cut down on eating out?",
+    "hello",
+    "may I ask something",
+    "what is the total cost of my car insurance",
+    "how much did I spend on movies since january",
+    "total expenses in q1",
+    "how much did I spend in the last 2 weeks",
+    "what was my biggest expense on groceries",
+    "how much did I spend in total 2000",
+])
+def test_parse_intent_leaves_question_to_llm(message):
+    assert parse_intent(message, NOW) is None
+
+
+@pytest.mark.parametrize("message", [
+    "total spent on flat 2024 rent",
+    "how many expenses for invoice 2023",
+])
+def test_bare_number_is_not_a_year(message):
+    intent = parse_intent(message, NOW)
+    assert intent is not None and intent.period is ALL_TIME